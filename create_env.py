@@ -3,11 +3,12 @@
 Create .env file with the correct settings.
 """
 
+import argparse
 import os
 import sys
 
 
-def create_env_file():
+def create_env_file(force=False):
     """Create .env file with proper settings."""
     
     env_content = """# Paperless-ngx Configuration
@@ -39,15 +40,16 @@ ALLOWED_ORIGINS=http://localhost,http://192.168.1.77,http://localhost:3000
 LOG_LEVEL=INFO
 """
     
-    if os.path.exists('.env'):
-        response = input(".env file already exists. Overwrite? (y/N): ")
-        if response.lower() != 'y':
-            print("Aborted.")
-            return False
+    if os.path.exists('.env') and not force:
+        print(".env file already exists. Re-run with --force to overwrite it.")
+        return False
     
     try:
-        with open('.env', 'w') as f:
+        # Write to a temp file and rename so a crash never leaves a truncated .env
+        tmp_path = '.env.tmp'
+        with open(tmp_path, 'w') as f:
             f.write(env_content)
+        os.replace(tmp_path, '.env')
         
         print("✅ Created .env file successfully!")
         print("\n⚠️  IMPORTANT: Edit .env file with your actual credentials:")
@@ -64,5 +66,9 @@ LOG_LEVEL=INFO
 
 
 if __name__ == "__main__":
-    success = create_env_file()
+    parser = argparse.ArgumentParser(description="Create .env file with the correct settings.")
+    parser.add_argument("--force", action="store_true", help="overwrite an existing .env file")
+    args = parser.parse_args()
+    
+    success = create_env_file(force=args.force)
     sys.exit(0 if success else 1)
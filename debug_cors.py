@@ -7,6 +7,34 @@ Run this script to test API connectivity and CORS headers.
 import requests
 import sys
 import subprocess
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from requests.adapters import HTTPAdapter
+
+def probe(session, base_url):
+    """Probe one API base URL; returns (base_url, status, cors_headers, options_status, error)."""
+    try:
+        # Test health endpoint
+        response = session.get(f"{base_url}/health", timeout=5)
+        
+        # Check CORS headers
+        headers = response.headers
+        cors_headers = {
+            'Access-Control-Allow-Origin': headers.get('Access-Control-Allow-Origin', 'MISSING'),
+            'Access-Control-Allow-Methods': headers.get('Access-Control-Allow-Methods', 'MISSING'),
+            'Access-Control-Allow-Headers': headers.get('Access-Control-Allow-Headers', 'MISSING')
+        }
+        
+        # Test OPTIONS request (preflight) over the same pooled connection
+        options_response = session.options(f"{base_url}/ask", timeout=5)
+        
+        return base_url, response.status_code, cors_headers, options_response.status_code, None
+        
+    except requests.exceptions.ConnectionError:
+        return base_url, None, None, None, f"Connection failed - API not accessible at {base_url}"
+    except requests.exceptions.Timeout:
+        return base_url, None, None, None, f"Timeout - API slow to respond at {base_url}"
+    except Exception as e:
+        return base_url, None, None, None, f"Error: {e}"
 
 def test_api_connection():
     """Test API connection and CORS headers."""
@@ -20,51 +48,49 @@ def test_api_connection():
         "http://192.168.1.77:8088"
     ]
     
-    for base_url in api_urls:
-        print(f"\nTesting {base_url}...")
+    session = requests.Session()
+    adapter = HTTPAdapter(pool_connections=len(api_urls), pool_maxsize=len(api_urls))
+    session.mount("http://", adapter)
+    
+    api_working = False
+    
+    # Probe all URLs at once so total time is the slowest probe, not the sum
+    with session, ThreadPoolExecutor(max_workers=len(api_urls)) as executor:
+        futures = [executor.submit(probe, session, base_url) for base_url in api_urls]
         
-        try:
-            # Test health endpoint
-            response = requests.get(f"{base_url}/health", timeout=5)
-            print(f"✓ Status Code: {response.status_code}")
+        for future in as_completed(futures):
+            base_url, status_code, cors_headers, options_status, error = future.result()
+            print(f"\nTesting {base_url}...")
+            
+            if error:
+                print(f"✗ {error}")
+                continue
             
-            # Check CORS headers
-            headers = response.headers
-            cors_headers = {
-                'Access-Control-Allow-Origin': headers.get('Access-Control-Allow-Origin', 'MISSING'),
-                'Access-Control-Allow-Methods': headers.get('Access-Control-Allow-Methods', 'MISSING'),
-                'Access-Control-Allow-Headers': headers.get('Access-Control-Allow-Headers', 'MISSING')
-            }
+            print(f"✓ Status Code: {status_code}")
             
             print("\nCORS Headers:")
             for header, value in cors_headers.items():
                 status = "✓" if value != "MISSING" else "✗"
                 print(f"  {status} {header}: {value}")
             
-            # Test OPTIONS request (preflight)
             print("\nTesting OPTIONS (preflight)...")
-            options_response = requests.options(f"{base_url}/ask", timeout=5)
-            print(f"  OPTIONS Status: {options_response.status_code}")
+            print(f"  OPTIONS Status: {options_status}")
             
-            if response.status_code == 200:
+            if status_code == 200:
                 print(f"\n✓ {base_url} is working!")
-                return True
-                
-        except requests.exceptions.ConnectionError:
-            print(f"✗ Connection failed - API not accessible at {base_url}")
-        except requests.exceptions.Timeout:
-            print(f"✗ Timeout - API slow to respond at {base_url}")
-        except Exception as e:
-            print(f"✗ Error: {e}")
+                api_working = True
     
-    return False
+    return api_working
 
 def check_docker_status():
     """Check if Docker containers are running."""
     print("\n" + "=" * 50)
     print("Docker Container Status:")
     try:
-        result = subprocess.run(['sudo', 'docker', 'compose', 'ps'], 
+        # Both containers have fixed names in docker-compose.yml, so plain
+        # `docker ps` can list them without the compose CLI loading the project
+        result = subprocess.run(['sudo', 'docker', 'ps', '-a',
+                                 '--filter', 'name=rag-api', '--filter', 'name=qdrant'],
                               capture_output=True, text=True)
         print(result.stdout)
     except Exception as e:
@@ -87,10 +113,10 @@ def main():
         print("   sudo docker compose up --build -d")
         print()
         print("2. Check if the API container is running:")
-        print("   sudo docker compose ps")
+        print("   sudo docker ps --filter name=rag-api")
         print()
         print("3. Check API logs for errors:")
-        print("   sudo docker compose logs rag-api")
+        print("   sudo docker logs rag-api")
     else:
         print("✓ API is accessible!")
         print()
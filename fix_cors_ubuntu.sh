@@ -26,7 +26,18 @@ sudo docker compose up -d
 # Step 4: Wait for API to be ready
 echo ""
 echo "4. Waiting for API to be ready..."
-sleep 10
+# Poll /health with backoff (0.1s growing to 2s) instead of a fixed sleep,
+# giving up after 30s. /health round-trips to the LLM, hence the 10s timeout.
+delay=0.1
+deadline=$((SECONDS + 30))
+until curl -sf -o /dev/null --max-time 10 http://localhost:8088/health; do
+    if [ $SECONDS -ge $deadline ]; then
+        echo "   API not healthy after 30 seconds, testing anyway"
+        break
+    fi
+    sleep $delay
+    delay=$(awk -v d="$delay" 'BEGIN { d *= 1.5; print (d > 2 ? 2 : d) }')
+done
 
 # Step 5: Test the API and CORS headers
 echo ""
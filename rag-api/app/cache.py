@@ -0,0 +1,162 @@
+"""Semantic cache for answers, keyed by query embedding."""
+
+import hashlib
+import json
+import logging
+import time
+from typing import Any, Dict, List, Optional
+
+import numpy as np
+
+logger = logging.getLogger(__name__)
+
+
+def make_context_key(**parts: Any) -> str:
+    """
+    Hash everything besides the query text that can change an answer.
+    
+    Args:
+        **parts: JSON-serializable request fields (history, filters, ...)
+    
+    Returns:
+        Hex digest identifying the request context
+    """
+    encoded = json.dumps(parts, sort_keys=True, default=str).encode("utf-8")
+    return hashlib.sha1(encoded).hexdigest()
+
+
+class AnswerCache:
+    """
+    In-memory cache of answers for semantically similar queries.
+    
+    Entries are matched by cosine similarity of L2-normalized query embeddings,
+    and only against entries stored under the same context key. Entries expire
+    after a TTL; when full, the least recently used entry is evicted.
+    
+    Each clear() bumps generation. A caller that computes an answer across an
+    await passes the generation it read beforehand to put(), so an answer
+    built from the old index is not stored after a clear().
+    """
+
+    def __init__(self, max_entries: int = 500, ttl_seconds: float = 300, threshold: float = 0.95):
+        self.max_entries = max_entries
+        self.ttl_seconds = ttl_seconds
+        self.threshold = threshold
+        self._vectors: Optional[np.ndarray] = None
+        self._keys: List[str] = []
+        self._values: List[Any] = []
+        self._created: List[float] = []
+        self._last_used: List[float] = []
+        self.hits = 0
+        self.misses = 0
+        self.generation = 0
+
+    def __len__(self) -> int:
+        return len(self._values)
+
+    def get(self, query_vector: np.ndarray, context_key: str) -> Optional[Any]:
+        """
+        Look up the cached answer for the most similar query.
+        
+        Args:
+            query_vector: L2-normalized query embedding
+            context_key: Key from make_context_key() for this request
+        
+        Returns:
+            Cached value, or None if no entry is similar enough
+        """
+        if not self._values or self.max_entries <= 0:
+            self.misses += 1
+            return None
+        
+        now = time.monotonic()
+        # One matrix-vector product scores every entry; ineligible ones are masked out
+        sims = self._vectors @ np.asarray(query_vector, dtype=np.float32)
+        for i, (key, created) in enumerate(zip(self._keys, self._created)):
+            if key != context_key or now - created > self.ttl_seconds:
+                sims[i] = -np.inf
+        
+        best = int(np.argmax(sims))
+        if sims[best] < self.threshold:
+            self.misses += 1
+            return None
+        
+        self.hits += 1
+        self._last_used[best] = now
+        logger.info(f"Answer cache hit (similarity {sims[best]:.3f})")
+        return self._values[best]
+
+    def put(
+        self,
+        query_vector: np.ndarray,
+        context_key: str,
+        value: Any,
+        generation: Optional[int] = None
+    ):
+        """
+        Store an answer for a query.
+        
+        Args:
+            query_vector: L2-normalized query embedding
+            context_key: Key from make_context_key() for this request
+            value: Answer to return for similar queries
+            generation: Value of self.generation when the answer was started;
+                the answer is dropped if the cache was cleared since
+        """
+        if self.max_entries <= 0:
+            return
+        if generation is not None and generation != self.generation:
+            logger.debug("Cache cleared while answering; not storing stale answer")
+            return
+        
+        now = time.monotonic()
+        self._evict(now)
+        
+        vector = np.asarray(query_vector, dtype=np.float32).reshape(1, -1)
+        self._vectors = vector if self._vectors is None else np.vstack([self._vectors, vector])
+        self._keys.append(context_key)
+        self._values.append(value)
+        self._created.append(now)
+        self._last_used.append(now)
+
+    def stats(self) -> Dict[str, Any]:
+        """
+        Get cache usage statistics.
+        
+        Returns:
+            Dictionary with entry count, capacity, hits, misses and hit rate
+        """
+        lookups = self.hits + self.misses
+        return {
+            "entries": len(self),
+            "max_entries": self.max_entries,
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": self.hits / lookups if lookups else 0.0
+        }
+
+    def clear(self):
+        """Drop every entry, e.g. after new documents were ingested."""
+        self.generation += 1
+        self._vectors = None
+        self._keys.clear()
+        self._values.clear()
+        self._created.clear()
+        self._last_used.clear()
+
+    def _evict(self, now: float):
+        """Remove expired entries, then least recently used ones until there is room."""
+        keep = [i for i, created in enumerate(self._created) if now - created <= self.ttl_seconds]
+        overflow = len(keep) - (self.max_entries - 1)
+        if overflow > 0:
+            keep.sort(key=lambda i: self._last_used[i])
+            keep = sorted(keep[overflow:])
+        
+        if len(keep) == len(self._values):
+            return
+        
+        self._vectors = self._vectors[keep] if keep else None
+        self._keys = [self._keys[i] for i in keep]
+        self._values = [self._values[i] for i in keep]
+        self._created = [self._created[i] for i in keep]
+        self._last_used = [self._last_used[i] for i in keep]
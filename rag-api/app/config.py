@@ -17,18 +17,29 @@ class Settings(BaseSettings):
     # OpenRouter Configuration
     OPENROUTER_API_KEY: str
     OPENROUTER_MODEL: str = "openai/gpt-oss-20b"
+    OPENROUTER_TIMEOUT: float = 30.0
     
     # Vector Database Configuration
     QDRANT_URL: str = "http://qdrant:6333"
+    QDRANT_PREFER_GRPC: bool = False
     
     # Embedding Configuration
     EMBEDDING_MODEL: str = "BAAI/bge-m3"
+    EMBEDDING_BATCH_SIZE: int = 64
+    EMBEDDING_BACKEND: str = "torch"
+    EMBEDDING_MODEL_FILE: str = ""
     
     # RAG Configuration
     RAG_TOP_K: int = 6
     CHUNK_TOKENS: int = 800
     CHUNK_OVERLAP: int = 120
     MAX_SNIPPETS_TOKENS: int = 2500
+    INGEST_CONCURRENCY: int = 8
+    
+    # Answer Cache Configuration (ANSWER_CACHE_SIZE=0 disables the cache)
+    ANSWER_CACHE_SIZE: int = 500
+    ANSWER_CACHE_TTL: int = 300
+    ANSWER_CACHE_THRESHOLD: float = 0.95
     
     # Server Configuration
     SERVER_HOST: str = "0.0.0.0"
@@ -1,8 +1,14 @@
 """Text extraction utilities for different document types."""
 
+import codecs
 import logging
+import multiprocessing
+import os
+import zipfile
+from concurrent.futures import ProcessPoolExecutor
+from functools import lru_cache
 from io import BytesIO
-from typing import List, Tuple, Optional
+from typing import BinaryIO, List, Tuple, Optional, Union
 import re
 
 try:
@@ -15,8 +21,39 @@ try:
 except ImportError:
     docx = None
 
+try:
+    import charset_normalizer
+    from charset_normalizer.utils import is_multi_byte_encoding
+except ImportError:
+    charset_normalizer = None
+
 logger = logging.getLogger(__name__)
 
+# Runs of whitespace, NUL bytes and OCR artifacts (anything that isn't a word
+# character or common punctuation) all collapse to a single space, so
+# clean_text needs only one scan of the input.
+_CLEAN_RE = re.compile(r'[^\w\-.,;:!?()[\]{}"\'/\\@#$%^&*+=<>~`|]+')
+
+# UTF-32 BOMs must be checked before UTF-16 since BOM_UTF32_LE starts with BOM_UTF16_LE
+_BOM_ENCODINGS = [
+    (codecs.BOM_UTF32_LE, 'utf-32'),
+    (codecs.BOM_UTF32_BE, 'utf-32'),
+    (codecs.BOM_UTF8, 'utf-8-sig'),
+    (codecs.BOM_UTF16_LE, 'utf-16'),
+    (codecs.BOM_UTF16_BE, 'utf-16'),
+]
+
+# PDFs with more pages than this have their pages extracted in parallel
+PDF_PARALLEL_MIN_PAGES = 8
+
+# Below this charset_normalizer coherence, a single-byte codepage guess is no
+# better than chance (e.g. b"h\xe9llo" comes back as cp1006)
+MIN_ENCODING_COHERENCE = 0.2
+
+# Encoding for non-UTF-8 text the detector can't place; the bytes it leaves
+# undefined fall back to latin-1, which decodes anything
+FALLBACK_TEXT_ENCODING = 'cp1252'
+
 
 def clean_text(text: str) -> str:
     """
@@ -31,61 +68,129 @@ def clean_text(text: str) -> str:
     if not text:
         return ""
     
-    # Remove null characters
-    text = text.replace("\x00", " ")
+    return _CLEAN_RE.sub(' ', text).strip()
+
+
+def _as_stream(content: Union[bytes, BinaryIO]) -> BinaryIO:
+    """Wrap bytes in a stream; rewind and return file objects as they are."""
+    if isinstance(content, bytes):
+        return BytesIO(content)
+    content.seek(0)
+    return content
+
+
+def _as_bytes(content: Union[bytes, BinaryIO]) -> bytes:
+    """Return the full content as bytes, reading file objects from the start."""
+    if isinstance(content, bytes):
+        return content
+    content.seek(0)
+    return content.read()
+
+
+def _extract_pdf_page_range(binary_content: bytes, start: int, end: int) -> List[Tuple[int, str]]:
+    """
+    Extract text from pages [start, end) of a PDF.
+    
+    Runs in a worker process, so it re-opens the PDF rather than sharing a reader.
     
-    # Normalize whitespace
-    text = re.sub(r'\s+', ' ', text)
+    Args:
+        binary_content: PDF file content as bytes
+        start: Index of the first page (0-based)
+        end: Index one past the last page
     
-    # Remove excessive newlines but preserve paragraph breaks
-    text = re.sub(r'\n\s*\n\s*\n+', '\n\n', text)
+    Returns:
+        List of tuples containing (page_number, text_content)
+    """
+    return _extract_reader_pages(PdfReader(BytesIO(binary_content)), start, end)
+
+
+def _extract_reader_pages(reader: PdfReader, start: int, end: int) -> List[Tuple[int, str]]:
+    """Extract and clean text from pages [start, end) of an open PdfReader."""
+    pages = []
     
-    # Clean up common OCR artifacts
-    text = re.sub(r'[^\w\s\-.,;:!?()[\]{}"\'/\\@#$%^&*+=<>~`|]', ' ', text)
+    for page_index in range(start, end):
+        page_num = page_index + 1
+        try:
+            text = reader.pages[page_index].extract_text() or ""
+            cleaned_text = clean_text(text)
+            
+            if cleaned_text:  # Only add pages with actual content
+                pages.append((page_num, cleaned_text))
+                
+        except Exception as e:
+            logger.warning(f"Failed to extract text from page {page_num}: {e}")
+            continue
     
-    return text.strip()
+    return pages
+
 
+@lru_cache(maxsize=1)
+def _get_pdf_pool() -> ProcessPoolExecutor:
+    """Create the shared PDF extraction pool on first use."""
+    # spawn, not fork: the API process has torch and the HTTP clients loaded,
+    # and forking a multi-threaded process can deadlock the children.
+    return ProcessPoolExecutor(
+        max_workers=os.cpu_count() or 1,
+        mp_context=multiprocessing.get_context("spawn")
+    )
 
-def extract_pdf_text(binary_content: bytes) -> List[Tuple[int, str]]:
+
+def extract_pdf_text(binary_content: Union[bytes, BinaryIO]) -> List[Tuple[int, str]]:
     """
     Extract text from PDF file.
     
+    Large PDFs are split into page ranges that are parsed in parallel worker
+    processes, since pypdf is pure Python and holds the GIL.
+    
     Args:
-        binary_content: PDF file content as bytes
+        binary_content: PDF file content as bytes or a seekable binary file
     
     Returns:
         List of tuples containing (page_number, text_content)
     """
-    pages = []
-    
     try:
-        reader = PdfReader(BytesIO(binary_content))
-        
-        for page_num, page in enumerate(reader.pages, start=1):
-            try:
-                text = page.extract_text() or ""
-                cleaned_text = clean_text(text)
-                
-                if cleaned_text:  # Only add pages with actual content
-                    pages.append((page_num, cleaned_text))
-                    
-            except Exception as e:
-                logger.warning(f"Failed to extract text from page {page_num}: {e}")
-                continue
-                
+        # pypdf reads objects from the stream on demand, so a spooled file is
+        # parsed without loading the whole document into memory
+        reader = PdfReader(_as_stream(binary_content))
+        page_count = len(reader.pages)
     except Exception as e:
         logger.error(f"Failed to parse PDF: {e}")
         raise ValueError(f"Unable to parse PDF: {e}")
     
-    return pages
+    workers = os.cpu_count() or 1
+    if page_count <= PDF_PARALLEL_MIN_PAGES or workers == 1:
+        return _extract_reader_pages(reader, 0, page_count)
+    
+    # Workers each need their own copy of the document
+    binary_content = _as_bytes(binary_content)
+    
+    shard_size = -(-page_count // workers)
+    ranges = [(start, min(start + shard_size, page_count))
+              for start in range(0, page_count, shard_size)]
+    
+    pool = _get_pdf_pool()
+    try:
+        futures = [pool.submit(_extract_pdf_page_range, binary_content, start, end)
+                   for start, end in ranges]
+        # Shards are submitted in page order, so concatenating keeps pages sorted
+        pages = []
+        for future in futures:
+            pages.extend(future.result())
+        return pages
+    except Exception as e:
+        logger.warning(f"Parallel PDF extraction failed, extracting serially: {e}")
+        # A crashed worker leaves the pool broken; start a fresh one next time
+        pool.shutdown(wait=False, cancel_futures=True)
+        _get_pdf_pool.cache_clear()
+        return _extract_reader_pages(reader, 0, page_count)
 
 
-def extract_docx_text(binary_content: bytes) -> str:
+def extract_docx_text(binary_content: Union[bytes, BinaryIO]) -> str:
     """
     Extract text from DOCX file.
     
     Args:
-        binary_content: DOCX file content as bytes
+        binary_content: DOCX file content as bytes or a seekable binary file
     
     Returns:
         Extracted text content
@@ -94,7 +199,7 @@ def extract_docx_text(binary_content: bytes) -> str:
         raise ImportError("python-docx package is required for DOCX extraction")
     
     try:
-        document = docx.Document(BytesIO(binary_content))
+        document = docx.Document(_as_stream(binary_content))
         
         # Extract text from paragraphs
         paragraphs = []
@@ -122,6 +227,43 @@ def extract_docx_text(binary_content: bytes) -> str:
         raise ValueError(f"Unable to parse DOCX: {e}")
 
 
+def detect_text_encoding(binary_content: bytes) -> str:
+    """
+    Guess the encoding of a text file from its BOM, a strict UTF-8 check,
+    or charset_normalizer, falling back to cp1252.
+    
+    Args:
+        binary_content: Text file content as bytes
+    
+    Returns:
+        Codec name suitable for bytes.decode
+    """
+    for bom, encoding in _BOM_ENCODINGS:
+        if binary_content.startswith(bom):
+            return encoding
+    
+    # Valid UTF-8 is by far the common case; checking the whole file also
+    # avoids misreading a sample that was cut inside a multi-byte character
+    try:
+        binary_content.decode('utf-8')
+        return 'utf-8'
+    except UnicodeDecodeError:
+        pass
+    
+    if charset_normalizer is not None:
+        # from_bytes samples chunks across the whole payload on its own
+        match = charset_normalizer.from_bytes(binary_content).best()
+        # Multi-byte codecs only match structurally valid input, so trust them;
+        # single-byte codepages decode anything and need language evidence
+        if match is not None and match.encoding != 'ascii' and (
+            is_multi_byte_encoding(match.encoding)
+            or match.coherence >= MIN_ENCODING_COHERENCE
+        ):
+            return match.encoding
+    
+    return FALLBACK_TEXT_ENCODING
+
+
 def extract_txt_text(binary_content: bytes) -> str:
     """
     Extract text from plain text file.
@@ -133,18 +275,13 @@ def extract_txt_text(binary_content: bytes) -> str:
         Extracted text content
     """
     try:
-        # Try different encodings
-        encodings = ['utf-8', 'utf-16', 'latin-1', 'cp1252']
-        
-        for encoding in encodings:
-            try:
-                text = binary_content.decode(encoding)
-                return clean_text(text)
-            except UnicodeDecodeError:
-                continue
-        
-        # If all encodings fail, use utf-8 with error handling
-        text = binary_content.decode('utf-8', errors='replace')
+        encoding = detect_text_encoding(binary_content)
+        try:
+            text = binary_content.decode(encoding)
+        except (UnicodeDecodeError, LookupError):
+            # latin-1 maps every byte, so nothing is dropped
+            logger.debug(f"Decoding as {encoding} failed, falling back to latin-1")
+            text = binary_content.decode('latin-1')
         return clean_text(text)
         
     except Exception as e:
@@ -152,13 +289,23 @@ def extract_txt_text(binary_content: bytes) -> str:
         raise ValueError(f"Unable to decode text file: {e}")
 
 
-def detect_file_type(filename: str, content: bytes) -> str:
+def _is_docx(content: Union[bytes, BinaryIO]) -> bool:
+    """Check a ZIP archive's central directory for the DOCX main document part."""
+    try:
+        with zipfile.ZipFile(_as_stream(content)) as archive:
+            archive.getinfo('word/document.xml')
+        return True
+    except (zipfile.BadZipFile, KeyError):
+        return False
+
+
+def detect_file_type(filename: str, content: Union[bytes, BinaryIO]) -> str:
     """
     Detect file type based on filename and content.
     
     Args:
         filename: Original filename
-        content: File content as bytes
+        content: File content as bytes or a seekable binary file
     
     Returns:
         File type string ('pdf', 'docx', 'txt', 'unknown')
@@ -174,14 +321,21 @@ def detect_file_type(filename: str, content: bytes) -> str:
         return 'txt'
     
     # Check by file signature (magic bytes)
-    if content.startswith(b'%PDF'):
+    if isinstance(content, bytes):
+        header = content[:1024]
+    else:
+        header = _as_stream(content).read(1024)
+    
+    if header.startswith(b'%PDF'):
         return 'pdf'
-    elif content.startswith(b'PK\x03\x04') and b'word/' in content[:1024]:
+    # The ZIP central directory sits at the end of the file, so a scan of the
+    # first KiB for 'word/' misses some DOCX files; ask the archive instead
+    elif header.startswith(b'PK\x03\x04') and _is_docx(content):
         return 'docx'
     
     # Default to txt for other text-like content
     try:
-        content[:1024].decode('utf-8')
+        header.decode('utf-8')
         return 'txt'
     except UnicodeDecodeError:
         pass
@@ -189,13 +343,16 @@ def detect_file_type(filename: str, content: bytes) -> str:
     return 'unknown'
 
 
-def extract_text_from_file(filename: str, binary_content: bytes) -> List[Tuple[Optional[int], str]]:
+def extract_text_from_file(
+    filename: str,
+    binary_content: Union[bytes, BinaryIO]
+) -> List[Tuple[Optional[int], str]]:
     """
     Extract text from a file based on its type.
     
     Args:
         filename: Original filename
-        binary_content: File content as bytes
+        binary_content: File content as bytes or a seekable binary file
     
     Returns:
         List of tuples containing (page_number, text_content)
@@ -210,7 +367,7 @@ def extract_text_from_file(filename: str, binary_content: bytes) -> List[Tuple[O
             text = extract_docx_text(binary_content)
             return [(None, text)] if text else []
         elif file_type == 'txt':
-            text = extract_txt_text(binary_content)
+            text = extract_txt_text(_as_bytes(binary_content))
             return [(None, text)] if text else []
         else:
             logger.warning(f"Unsupported file type '{file_type}' for file '{filename}'")
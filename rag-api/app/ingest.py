@@ -1,17 +1,22 @@
 """Document ingestion and text chunking for the vector database."""
 
+import asyncio
 import logging
 import math
-from typing import List, Dict, Any, Optional
+from typing import List, Dict, Any, Optional, Tuple, Union
 from datetime import datetime
+import numpy as np
 import tiktoken
 from qdrant_client import QdrantClient
-from qdrant_client.http.models import Distance, VectorParams, PointStruct, Filter, FieldCondition, MatchValue
+from qdrant_client.http.models import (
+    Distance, VectorParams, Filter, FieldCondition, MatchValue, MatchAny,
+    ScalarQuantization, ScalarQuantizationConfig, ScalarType, PayloadSchemaType
+)
 from sentence_transformers import SentenceTransformer
 
 from .config import get_settings
 from .extractors import extract_text_from_file
-from .paperless import get_document, download_document
+from .paperless import get_document, download_document_file, fetch_documents_bulk
 
 logger = logging.getLogger(__name__)
 settings = get_settings()
@@ -19,6 +24,20 @@ settings = get_settings()
 # Collection name for storing document chunks
 COLLECTION_NAME = "paperless_chunks"
 
+# Number of documents fetched and embedded together by ingest_documents()
+DOCUMENTS_PER_BATCH = 16
+
+# Payload fields that searches, existence checks and deletes filter on, and
+# that chunk summaries facet over
+PAYLOAD_INDEXES = {
+    "doc_id": PayloadSchemaType.INTEGER,
+    "tags": PayloadSchemaType.KEYWORD,
+    "file_type": PayloadSchemaType.KEYWORD,
+}
+
+# Number of points sent to Qdrant per upload request
+UPSERT_BATCH_SIZE = 256
+
 # Initialize tokenizer for counting tokens
 try:
     tokenizer = tiktoken.get_encoding("cl100k_base")
@@ -44,7 +63,7 @@ def count_tokens(text: str) -> int:
         return len(text) // 4
 
 
-def chunk_text(text: str, chunk_tokens: int = None, overlap_tokens: int = None) -> List[str]:
+def chunk_text(text: str, chunk_tokens: int = None, overlap_tokens: int = None) -> List[Tuple[str, int]]:
     """
     Split text into overlapping chunks based on token count.
     
@@ -54,42 +73,73 @@ def chunk_text(text: str, chunk_tokens: int = None, overlap_tokens: int = None)
         overlap_tokens: Token overlap between chunks
     
     Returns:
-        List of text chunks
+        List of (chunk_text, token_count) tuples; the count comes from the
+        tokenization done for chunking, so callers needn't re-encode
+    """
+    return chunk_pages([text], chunk_tokens, overlap_tokens)[0]
+
+
+def chunk_pages(
+    texts: List[str],
+    chunk_tokens: int = None,
+    overlap_tokens: int = None
+) -> List[List[Tuple[str, int]]]:
+    """
+    Split several texts into overlapping chunks based on token count.
+    
+    All texts are encoded in one encode_batch call and all windows decoded
+    in one decode_batch call, rather than one tokenizer call per window.
+    
+    Args:
+        texts: Texts to chunk, e.g. the pages of a document
+        chunk_tokens: Maximum tokens per chunk
+        overlap_tokens: Token overlap between chunks
+    
+    Returns:
+        One list of (chunk_text, token_count) tuples per input text
     """
     if chunk_tokens is None:
         chunk_tokens = settings.CHUNK_TOKENS
     if overlap_tokens is None:
         overlap_tokens = settings.CHUNK_OVERLAP
     
-    if not text.strip():
-        return []
+    step = chunk_tokens - overlap_tokens
     
     if tokenizer:
         # Use actual tokenization
-        tokens = tokenizer.encode(text)
-        chunks = []
+        non_empty = [i for i, text in enumerate(texts) if text.strip()]
+        encoded = tokenizer.encode_batch([texts[i] for i in non_empty])
         
-        step = chunk_tokens - overlap_tokens
-        for i in range(0, len(tokens), step):
-            chunk_tokens_slice = tokens[i:i + chunk_tokens]
-            chunk_text = tokenizer.decode(chunk_tokens_slice)
-            chunks.append(chunk_text.strip())
+        # Remember which text each window came from so decoded chunks can be regrouped
+        owners = []
+        slices = []
+        for text_index, tokens in zip(non_empty, encoded):
+            for i in range(0, len(tokens), step):
+                owners.append(text_index)
+                slices.append(tokens[i:i + chunk_tokens])
         
-        return [chunk for chunk in chunks if chunk]
+        results = [[] for _ in texts]
+        for text_index, token_slice, decoded in zip(owners, slices, tokenizer.decode_batch(slices)):
+            decoded = decoded.strip()
+            if decoded:
+                results[text_index].append((decoded, len(token_slice)))
+        
+        return results
     else:
         # Fallback to character-based chunking
         chars_per_chunk = chunk_tokens * 4  # Approximate
-        overlap_chars = overlap_tokens * 4
-        
-        chunks = []
-        step = chars_per_chunk - overlap_chars
+        char_step = step * 4
         
-        for i in range(0, len(text), step):
-            chunk = text[i:i + chars_per_chunk].strip()
-            if chunk:
-                chunks.append(chunk)
+        results = []
+        for text in texts:
+            chunks = []
+            for i in range(0, len(text), char_step):
+                chunk = text[i:i + chars_per_chunk].strip()
+                if chunk:
+                    chunks.append((chunk, len(chunk) // 4))
+            results.append(chunks)
         
-        return chunks
+        return results
 
 
 def ensure_collection(qdrant_client: QdrantClient, embedding_dimension: int):
@@ -101,17 +151,40 @@ def ensure_collection(qdrant_client: QdrantClient, embedding_dimension: int):
         embedding_dimension: Dimension of embedding vectors
     """
     try:
-        collections = qdrant_client.get_collections()
-        collection_names = [c.name for c in collections.collections]
-        
-        if COLLECTION_NAME not in collection_names:
+        # collection_exists asks about this one collection instead of listing them all
+        if not qdrant_client.collection_exists(COLLECTION_NAME):
             logger.info(f"Creating collection '{COLLECTION_NAME}'")
-            qdrant_client.recreate_collection(
+            qdrant_client.create_collection(
                 collection_name=COLLECTION_NAME,
-                vectors_config=VectorParams(size=embedding_dimension, distance=Distance.COSINE)
+                # Vectors are L2-normalized at encode time (ingest and query),
+                # so a plain dot product is the cosine similarity. The float32
+                # originals live on disk (mmap) and are only read for rescoring
+                vectors_config=VectorParams(
+                    size=embedding_dimension,
+                    distance=Distance.DOT,
+                    on_disk=True
+                ),
+                # Search runs on an int8 copy of the vectors kept in RAM
+                quantization_config=ScalarQuantization(
+                    scalar=ScalarQuantizationConfig(
+                        type=ScalarType.INT8,
+                        quantile=0.99,
+                        always_ram=True
+                    )
+                )
             )
         else:
             logger.info(f"Collection '{COLLECTION_NAME}' already exists")
+        
+        # Index filtered fields so doc_id/tag filters don't scan every point.
+        # Creating an index that already exists is a no-op, so collections
+        # made before the indexes were added pick them up here.
+        for field_name, field_schema in PAYLOAD_INDEXES.items():
+            qdrant_client.create_payload_index(
+                collection_name=COLLECTION_NAME,
+                field_name=field_name,
+                field_schema=field_schema
+            )
             
     except Exception as e:
         logger.error(f"Failed to ensure collection: {e}")
@@ -121,7 +194,7 @@ def ensure_collection(qdrant_client: QdrantClient, embedding_dimension: int):
 def upsert_chunks_to_qdrant(
     qdrant_client: QdrantClient,
     chunks: List[Dict[str, Any]],
-    vectors: List[List[float]]
+    vectors: np.ndarray
 ):
     """
     Upsert document chunks and their vectors to Qdrant.
@@ -129,73 +202,91 @@ def upsert_chunks_to_qdrant(
     Args:
         qdrant_client: Qdrant client instance
         chunks: List of chunk metadata dictionaries
-        vectors: List of embedding vectors
+        vectors: float32 array of embedding vectors, one row per chunk
     """
     if len(chunks) != len(vectors):
         raise ValueError("Number of chunks must match number of vectors")
     
-    points = []
-    for i, (chunk, vector) in enumerate(zip(chunks, vectors)):
-        # Generate a unique integer ID based on doc_id, page, and chunk index
+    point_ids = []
+    chunk_indexes: Dict[int, int] = {}
+    for chunk in chunks:
+        # Pack doc_id and the chunk's index within its document (chunks from
+        # several documents may be mixed) into one uint64: doc_id << 32 | index.
+        # The index is unique per document, so the page isn't needed, and
+        # neither half can overflow into the other.
         doc_id = chunk['doc_id']
-        page = chunk.get('page', 0) or 0
-        # Create unique integer ID: doc_id * 1000000 + page * 1000 + chunk_index
-        point_id = doc_id * 1000000 + page * 1000 + i
-        
-        points.append(PointStruct(
-            id=point_id,
-            vector=vector,
-            payload=chunk
-        ))
+        i = chunk_indexes.get(doc_id, 0)
+        chunk_indexes[doc_id] = i + 1
+        point_ids.append(doc_id << 32 | i)
     
     try:
-        qdrant_client.upsert(collection_name=COLLECTION_NAME, points=points)
-        logger.info(f"Upserted {len(points)} chunks to Qdrant")
+        # upload_collection takes the numpy array as-is, so vectors are never
+        # expanded into Python float lists; it also splits large ingests into
+        # fixed-size requests
+        qdrant_client.upload_collection(
+            collection_name=COLLECTION_NAME,
+            vectors=vectors,
+            payload=chunks,
+            ids=point_ids,
+            batch_size=UPSERT_BATCH_SIZE,
+            wait=True
+        )
+        logger.info(f"Upserted {len(point_ids)} chunks to Qdrant")
     except Exception as e:
         logger.error(f"Failed to upsert chunks to Qdrant: {e}")
         raise
 
 
-async def ingest_document(
+async def _prepare_document(
     doc_id: int,
     qdrant_client: QdrantClient,
-    embedding_model: SentenceTransformer,
-    force_reindex: bool = False
-) -> Dict[str, Any]:
+    force_reindex: bool = False,
+    doc_metadata: Union[Dict[str, Any], Exception, None] = None
+) -> Tuple[List[Dict[str, Any]], Dict[str, Any]]:
     """
-    Ingest a single document into the vector database.
+    Fetch, extract and chunk a single document, without embedding it.
     
     Args:
         doc_id: Paperless document ID
         qdrant_client: Qdrant client instance
-        embedding_model: Sentence transformer model for embeddings
         force_reindex: Whether to reindex even if document already exists
+        doc_metadata: Metadata already fetched by fetch_documents_bulk(), or
+            the exception raised fetching it; fetched here when None
     
     Returns:
-        Dictionary with ingestion results
+        Tuple of (chunks, result). When no chunks are returned the result
+        dictionary is final (skipped, failed or error).
     """
     logger.info(f"Starting ingestion of document {doc_id}")
     
     try:
-        # Get document metadata
-        doc_metadata = await get_document(doc_id)
+        # Get document metadata, unless it was fetched in bulk already
+        if doc_metadata is None:
+            doc_metadata = await get_document(doc_id)
+        elif isinstance(doc_metadata, Exception):
+            raise doc_metadata
         title = doc_metadata.get('title', f'Document {doc_id}')
         file_type = doc_metadata.get('file_type', 'unknown')
         tags = [tag['name'] for tag in doc_metadata.get('tags', [])]
         
         # Check if document already exists (unless force reindex)
         if not force_reindex:
-            existing_chunks = qdrant_client.scroll(
+            # count() transfers no payload. It stays exact: an approximate
+            # count is a cardinality estimate that can be non-zero for a
+            # document with no points, which would wrongly skip it.
+            # Run off the event loop so concurrent documents keep downloading.
+            existing_chunks = (await asyncio.to_thread(
+                qdrant_client.count,
                 collection_name=COLLECTION_NAME,
-                scroll_filter=Filter(
+                count_filter=Filter(
                     must=[FieldCondition(key="doc_id", match=MatchValue(value=doc_id))]
                 ),
-                limit=1
-            )[0]
+                exact=True
+            )).count
             
-            if existing_chunks:
+            if existing_chunks > 0:
                 logger.info(f"Document {doc_id} already indexed, skipping")
-                return {
+                return [], {
                     "doc_id": doc_id,
                     "title": title,
                     "status": "skipped",
@@ -204,15 +295,14 @@ async def ingest_document(
                 }
         
         # Download document content
-        doc_content = await download_document(doc_id)
         filename = doc_metadata.get('original_filename', f'document_{doc_id}.pdf')
-        
-        # Extract text
-        extracted_pages = extract_text_from_file(filename, doc_content)
+        with await download_document_file(doc_id) as doc_file:
+            # Extract text off the event loop; large PDFs fan out to worker processes
+            extracted_pages = await asyncio.to_thread(extract_text_from_file, filename, doc_file)
         
         if not extracted_pages:
             logger.warning(f"No text extracted from document {doc_id}")
-            return {
+            return [], {
                 "doc_id": doc_id,
                 "title": title,
                 "status": "failed",
@@ -220,16 +310,15 @@ async def ingest_document(
                 "reason": "no_text_extracted"
             }
         
-        # Process each page and create chunks
+        # Chunk all pages together, then attach metadata to each chunk
+        page_chunks = chunk_pages([page_text for _, page_text in extracted_pages])
+        
+        # Fields shared by every chunk of the document are built once
+        ingested_at = datetime.utcnow().isoformat()
+        
         all_chunks = []
-        for page_num, page_text in extracted_pages:
-            if not page_text.strip():
-                continue
-            
-            # Split page text into chunks
-            text_chunks = chunk_text(page_text)
-            
-            for text_chunk in text_chunks:
+        for (page_num, _), text_chunks in zip(extracted_pages, page_chunks):
+            for text_chunk, token_count in text_chunks:
                 chunk_metadata = {
                     "text": text_chunk,
                     "doc_id": doc_id,
@@ -237,14 +326,14 @@ async def ingest_document(
                     "page": page_num,
                     "file_type": file_type,
                     "tags": tags,
-                    "ingested_at": datetime.utcnow().isoformat(),
-                    "token_count": count_tokens(text_chunk)
+                    "ingested_at": ingested_at,
+                    "token_count": token_count
                 }
                 all_chunks.append(chunk_metadata)
         
         if not all_chunks:
             logger.warning(f"No chunks created from document {doc_id}")
-            return {
+            return [], {
                 "doc_id": doc_id,
                 "title": title,
                 "status": "failed",
@@ -252,30 +341,7 @@ async def ingest_document(
                 "reason": "no_chunks_created"
             }
         
-        # Generate embeddings
-        logger.info(f"Generating embeddings for {len(all_chunks)} chunks")
-        chunk_texts = [chunk["text"] for chunk in all_chunks]
-        embeddings = embedding_model.encode(chunk_texts, convert_to_tensor=False)
-        
-        # Convert to list of lists if needed
-        if hasattr(embeddings, 'tolist'):
-            embeddings = embeddings.tolist()
-        
-        # Remove existing chunks for this document if reindexing
-        if force_reindex:
-            qdrant_client.delete(
-                collection_name=COLLECTION_NAME,
-                points_selector=Filter(
-                    must=[FieldCondition(key="doc_id", match=MatchValue(value=doc_id))]
-                )
-            )
-        
-        # Upsert chunks to Qdrant
-        upsert_chunks_to_qdrant(qdrant_client, all_chunks, embeddings)
-        
-        logger.info(f"Successfully ingested document {doc_id} with {len(all_chunks)} chunks")
-        
-        return {
+        return all_chunks, {
             "doc_id": doc_id,
             "title": title,
             "status": "success",
@@ -285,7 +351,7 @@ async def ingest_document(
         
     except Exception as e:
         logger.error(f"Failed to ingest document {doc_id}: {e}")
-        return {
+        return [], {
             "doc_id": doc_id,
             "title": f"Document {doc_id}",
             "status": "error",
@@ -294,6 +360,164 @@ async def ingest_document(
         }
 
 
+def _store_prepared_group(
+    prepared: List[Tuple[List[Dict[str, Any]], Dict[str, Any]]],
+    qdrant_client: QdrantClient,
+    embedding_model: SentenceTransformer,
+    force_reindex: bool
+) -> List[Tuple[List[Dict[str, Any]], Dict[str, Any]]]:
+    """
+    Embed and store the chunks of a group of prepared documents.
+    
+    Blocking; ingest_documents runs it in a worker thread.
+    
+    Args:
+        prepared: (chunks, result) pairs from _prepare_document
+        qdrant_client: Qdrant client instance
+        embedding_model: Sentence transformer model for embeddings
+        force_reindex: Whether to remove the documents' existing chunks first
+    
+    Returns:
+        The prepared pairs, with results turned into errors if storing failed
+    """
+    batch_chunks = [chunk for chunks, _ in prepared for chunk in chunks]
+    if not batch_chunks:
+        return prepared
+    
+    try:
+        # Generate embeddings for every chunk in the group at once
+        logger.info(f"Generating embeddings for {len(batch_chunks)} chunks "
+                    f"from {sum(1 for chunks, _ in prepared if chunks)} documents")
+        embeddings = embedding_model.encode(
+            [chunk["text"] for chunk in batch_chunks],
+            batch_size=settings.EMBEDDING_BATCH_SIZE,
+            normalize_embeddings=True,
+            convert_to_numpy=True,
+            show_progress_bar=False
+        ).astype(np.float32, copy=False)
+        
+        # Remove existing chunks for these documents if reindexing
+        if force_reindex:
+            qdrant_client.delete(
+                collection_name=COLLECTION_NAME,
+                points_selector=Filter(
+                    must=[FieldCondition(
+                        key="doc_id",
+                        match=MatchAny(any=[result["doc_id"] for chunks, result in prepared if chunks])
+                    )]
+                )
+            )
+        
+        # Upsert chunks to Qdrant
+        upsert_chunks_to_qdrant(qdrant_client, batch_chunks, embeddings)
+        return prepared
+        
+    except Exception as e:
+        logger.error(f"Failed to embed or store documents "
+                     f"{[result['doc_id'] for _, result in prepared]}: {e}")
+        return [
+            ([], {
+                "doc_id": result["doc_id"],
+                "title": result["title"],
+                "status": "error",
+                "chunks_created": 0,
+                "error": str(e)
+            }) if chunks else (chunks, result)
+            for chunks, result in prepared
+        ]
+
+
+async def ingest_documents(
+    doc_ids: List[int],
+    qdrant_client: QdrantClient,
+    embedding_model: SentenceTransformer,
+    force_reindex: bool = False
+) -> List[Dict[str, Any]]:
+    """
+    Ingest several documents, embedding their chunks in shared batches.
+    
+    Documents are processed in groups of DOCUMENTS_PER_BATCH: each group is
+    fetched and chunked concurrently (at most INGEST_CONCURRENCY documents at
+    a time), all of its chunks go through a single
+    encode() call, and the vectors are written with a single upsert. While
+    one group is being embedded and stored, the next group is already being
+    downloaded and extracted.
+    
+    Args:
+        doc_ids: Paperless document IDs
+        qdrant_client: Qdrant client instance
+        embedding_model: Sentence transformer model for embeddings
+        force_reindex: Whether to reindex even if documents already exist
+    
+    Returns:
+        List of per-document ingestion results, in the order of doc_ids
+    """
+    # Bounds downloads and extractions across the current and prefetched group
+    semaphore = asyncio.Semaphore(max(1, settings.INGEST_CONCURRENCY))
+    
+    async def prepare(doc_id: int, doc_metadata) -> Tuple[List[Dict[str, Any]], Dict[str, Any]]:
+        async with semaphore:
+            return await _prepare_document(doc_id, qdrant_client, force_reindex, doc_metadata)
+    
+    async def prepare_docs(group: List[int]) -> List[Tuple[List[Dict[str, Any]], Dict[str, Any]]]:
+        # Metadata requests are cheap, so the whole group's go out together
+        metadata = await fetch_documents_bulk(group, concurrency=len(group))
+        return await asyncio.gather(*(
+            prepare(doc_id, doc_metadata) for doc_id, doc_metadata in zip(group, metadata)
+        ))
+    
+    def prepare_group(start: int) -> asyncio.Future:
+        return asyncio.ensure_future(prepare_docs(doc_ids[start:start + DOCUMENTS_PER_BATCH]))
+    
+    results = []
+    if not doc_ids:
+        return results
+    
+    # Keep at most one group in flight ahead of the one being embedded
+    next_group = prepare_group(0)
+    try:
+        for start in range(0, len(doc_ids), DOCUMENTS_PER_BATCH):
+            prepared = await next_group
+            if start + DOCUMENTS_PER_BATCH < len(doc_ids):
+                next_group = prepare_group(start + DOCUMENTS_PER_BATCH)
+            
+            prepared = await asyncio.to_thread(
+                _store_prepared_group, prepared, qdrant_client, embedding_model, force_reindex
+            )
+            
+            for chunks, result in prepared:
+                if chunks:
+                    logger.info(f"Successfully ingested document {result['doc_id']} with {len(chunks)} chunks")
+                results.append(result)
+    finally:
+        # Don't leave a prefetch running if storing raised or we were cancelled
+        next_group.cancel()
+    
+    return results
+
+
+async def ingest_document(
+    doc_id: int,
+    qdrant_client: QdrantClient,
+    embedding_model: SentenceTransformer,
+    force_reindex: bool = False
+) -> Dict[str, Any]:
+    """
+    Ingest a single document into the vector database.
+    
+    Args:
+        doc_id: Paperless document ID
+        qdrant_client: Qdrant client instance
+        embedding_model: Sentence transformer model for embeddings
+        force_reindex: Whether to reindex even if document already exists
+    
+    Returns:
+        Dictionary with ingestion results
+    """
+    results = await ingest_documents([doc_id], qdrant_client, embedding_model, force_reindex)
+    return results[0]
+
+
 async def remove_document(doc_id: int, qdrant_client: QdrantClient) -> bool:
     """
     Remove all chunks for a document from the vector database.
@@ -1,16 +1,73 @@
 """LLM integration with OpenRouter for generating answers."""
 
+import asyncio
 import logging
-from typing import List, Dict, Any, Optional
+import re
+from collections import defaultdict
+from functools import lru_cache
+from typing import AsyncIterator, List, Dict, Any, Optional, Tuple
 import httpx
 import json
-from datetime import datetime
+import tiktoken
+from datetime import date, datetime
 
 from .config import get_settings
 
 logger = logging.getLogger(__name__)
 settings = get_settings()
 
+OPENROUTER_URL = "https://openrouter.ai/api/v1/chat/completions"
+
+# Attempts per call_openrouter(). All but the last are cut off after
+# OPENROUTER_TIMEOUT so a stalled generation is retried early; the last gets
+# the client's full 120s, so long answers still complete
+OPENROUTER_ATTEMPTS = 2
+
+# Initialize tokenizer for counting prompt tokens
+try:
+    tokenizer = tiktoken.get_encoding("cl100k_base")
+except Exception:
+    logger.warning("Failed to load tiktoken, using approximate token counting")
+    tokenizer = None
+
+# Shared client so OpenRouter calls reuse kept-alive TLS connections instead of
+# handshaking on every request; created on first use, closed on app shutdown
+_http_client: Optional[httpx.AsyncClient] = None
+
+
+def get_http_client() -> httpx.AsyncClient:
+    """
+    Get the shared HTTP client for OpenRouter, creating it on first use.
+    
+    Returns:
+        Pooled httpx.AsyncClient
+    """
+    global _http_client
+    if _http_client is None or _http_client.is_closed:
+        _http_client = httpx.AsyncClient(
+            timeout=httpx.Timeout(120.0, connect=10.0),
+            limits=httpx.Limits(max_connections=100, max_keepalive_connections=20),
+            # Concurrent questions share one multiplexed connection
+            http2=True
+        )
+    return _http_client
+
+
+async def close_http_client():
+    """Close the shared HTTP client and its pooled connections."""
+    global _http_client
+    if _http_client is not None:
+        await _http_client.aclose()
+        _http_client = None
+
+
+# Look for patterns like [Document Title, Page 1] or [Document Title]
+CITATION_PATTERNS = [
+    re.compile(r'\[([^\]]+)\]'),  # Basic [citation] pattern
+    re.compile(r'\(([^)]+, [Pp]age \d+)\)'),  # (citation, page X) pattern
+    re.compile(r'\(([^)]+)\)')  # Basic (citation) pattern
+]
+
 # System prompt for RAG Q&A
 SYSTEM_PROMPT = """You are a helpful and intelligent document assistant. Today's date is {today}. You have access to a knowledge base of documents and can answer questions based on their content. When documents appear to be from the same project or related topics, make connections between them to provide comprehensive insights.
 
@@ -31,18 +88,44 @@ Key guidelines:
 Remember: Users expect thorough, actionable answers that cover all relevant aspects found in the documents."""
 
 
+# Token allowance for a "Page N:" line in the context
+PAGE_PREFIX_TOKENS = 4
+
+
+@lru_cache(maxsize=1)
+def _format_system_prompt(today: date) -> str:
+    """Format the system prompt for a given date."""
+    return SYSTEM_PROMPT.format(today=today.strftime("%B %d, %Y"))
+
+
+def get_system_prompt() -> str:
+    """
+    Get the system prompt with today's date filled in.
+    
+    Returns:
+        Formatted system prompt, reformatted only when the date changes
+    """
+    return _format_system_prompt(date.today())
+
+
+@lru_cache(maxsize=4096)
 def estimate_tokens(text: str) -> int:
     """
     Estimate token count for text.
     
+    Counts are cached by text, since the same chunks are retrieved for many
+    questions and chat history is resent with every turn.
+    
     Args:
         text: Input text
     
     Returns:
         Estimated token count
     """
-    # Rough approximation: 1 token ≈ 4 characters
-    return len(text) // 4
+    if tokenizer is None:
+        # Rough approximation: 1 token ≈ 4 characters
+        return len(text) // 4
+    return len(tokenizer.encode(text, disallowed_special=()))
 
 
 def build_context_prompt(query: str, chunks: List[Dict[str, Any]], history: Optional[List[Dict[str, str]]] = None) -> List[Dict[str, str]]:
@@ -52,53 +135,54 @@ def build_context_prompt(query: str, chunks: List[Dict[str, Any]], history: Opti
     Args:
         query: User's question
         chunks: List of relevant document chunks
+        history: Optional recent chat history, oldest first
     
     Returns:
         List of message dictionaries for the LLM
     """
-    # Build context from chunks, grouping by document
-    doc_groups = {}
+    # Build context from chunks, grouping by document (first title seen wins)
+    doc_chunks = defaultdict(list)
+    doc_titles = {}
     for chunk in chunks:
         doc_id = chunk.get("doc_id")
-        if doc_id not in doc_groups:
-            doc_groups[doc_id] = {
-                "title": chunk.get("title", "Unknown Document"),
-                "chunks": []
-            }
-        doc_groups[doc_id]["chunks"].append(chunk)
+        doc_chunks[doc_id].append(chunk)
+        doc_titles.setdefault(doc_id, chunk.get("title", "Unknown Document"))
     
+    # Collect the pieces and join once at the end; chunk texts are never
+    # copied into per-entry strings, only into the final context
     context_parts = []
     total_tokens = 0
     max_tokens = settings.MAX_SNIPPETS_TOKENS
     
     # Format context by document
-    for doc_id, doc_info in doc_groups.items():
-        title = doc_info["title"]
-        
-        # Start document section
-        doc_header = f"\n=== From document: {title} ===\n"
-        context_parts.append(doc_header)
+    for doc_id, doc_chunk_list in doc_chunks.items():
+        header_added = False
         
         # Add chunks from this document
-        for chunk in doc_info["chunks"]:
+        for chunk in doc_chunk_list:
             page = chunk.get("page")
             text = chunk.get("text", "")
             
-            if page:
-                context_entry = f"Page {page}:\n{text}\n"
-            else:
-                context_entry = f"{text}\n"
-            
-            # Check token limit
-            entry_tokens = estimate_tokens(context_entry)
+            # Check token limit for the entry prefix + text + trailing newline
+            # before building anything; the text is counted on its own so its
+            # count can be cached
+            entry_tokens = estimate_tokens(text) + (PAGE_PREFIX_TOKENS if page else 0) + 1
             if total_tokens + entry_tokens > max_tokens:
                 logger.warning(f"Reached token limit, truncating context")
                 break
             
-            context_parts.append(context_entry)
+            # Start the document section with its first kept chunk, so no
+            # empty sections are left behind when the budget runs out
+            if not header_added:
+                if context_parts:
+                    context_parts.append("\n")
+                context_parts += ("\n=== From document: ", doc_titles[doc_id], " ===\n")
+                header_added = True
+            
+            context_parts += ("\n", f"Page {page}:\n" if page else "", text, "\n")
             total_tokens += entry_tokens
     
-    context = "\n".join(context_parts)
+    context = "".join(context_parts)
     
     # Build user message
     user_message = f"""Question: {query}
@@ -108,35 +192,42 @@ Context from documents:
 
 Please answer the question based on the provided context. When referencing information, mention the document titles naturally in your response."""
     
-    # Format system prompt with today's date
-    from datetime import date
-    system_prompt = SYSTEM_PROMPT.format(today=date.today().strftime("%B %d, %Y"))
-    messages = [{"role": "system", "content": system_prompt}]
-    # Append recent history (bounded to last 6 exchanges)
+    messages = [{"role": "system", "content": get_system_prompt()}]
+    # Append recent history (bounded to last 6 exchanges and a quarter of the
+    # context budget), dropping the oldest messages first
     if history:
-        trimmed = history[-12:]
-        for msg in trimmed:
-            if msg.get("role") in {"user", "assistant", "system"} and isinstance(msg.get("content"), str):
-                messages.append({"role": msg["role"], "content": msg["content"]})
+        history_budget = max_tokens // 4
+        kept = []
+        for msg in reversed(history[-12:]):
+            if msg.get("role") not in {"user", "assistant", "system"} or not isinstance(msg.get("content"), str):
+                continue
+            msg_tokens = estimate_tokens(msg["content"])
+            if msg_tokens > history_budget:
+                break
+            history_budget -= msg_tokens
+            kept.append({"role": msg["role"], "content": msg["content"]})
+        messages.extend(reversed(kept))
     messages.append({"role": "user", "content": user_message})
     
     return messages
 
 
-async def call_openrouter(messages: List[Dict[str, str]], model: Optional[str] = None) -> Dict[str, Any]:
+def _openrouter_request(
+    messages: List[Dict[str, str]],
+    model: str,
+    stream: bool = False
+) -> Tuple[Dict[str, str], Dict[str, Any]]:
     """
-    Call OpenRouter API to generate a response.
+    Build the headers and JSON payload for an OpenRouter chat completion.
     
     Args:
         messages: List of conversation messages
-        model: Optional model override
+        model: Model to use
+        stream: Whether to request a server-sent event stream
     
     Returns:
-        Dictionary with response data
+        Tuple of (headers, payload)
     """
-    if model is None:
-        model = settings.OPENROUTER_MODEL
-    
     headers = {
         "Authorization": f"Bearer {settings.OPENROUTER_API_KEY}",
         "Content-Type": "application/json",
@@ -150,32 +241,61 @@ async def call_openrouter(messages: List[Dict[str, str]], model: Optional[str] =
         "temperature": 0.2,
         "top_p": 0.9,
         "max_tokens": 1000,  # Reasonable limit for answers
-        "stream": False
+        "stream": stream
     }
     
+    return headers, payload
+
+
+async def call_openrouter(messages: List[Dict[str, str]], model: Optional[str] = None) -> Dict[str, Any]:
+    """
+    Call OpenRouter API to generate a response.
+    
+    Args:
+        messages: List of conversation messages
+        model: Optional model override
+    
+    Returns:
+        Dictionary with response data
+    """
+    if model is None:
+        model = settings.OPENROUTER_MODEL
+    
+    headers, payload = _openrouter_request(messages, model)
+    
     try:
-        async with httpx.AsyncClient(timeout=120) as client:
-            response = await client.post(
-                "https://openrouter.ai/api/v1/chat/completions",
-                json=payload,
-                headers=headers
-            )
-            response.raise_for_status()
-            
-            data = response.json()
+        for attempt in range(1, OPENROUTER_ATTEMPTS + 1):
+            final_attempt = attempt == OPENROUTER_ATTEMPTS
+            try:
+                response = await asyncio.wait_for(
+                    get_http_client().post(OPENROUTER_URL, json=payload, headers=headers),
+                    timeout=None if final_attempt else settings.OPENROUTER_TIMEOUT
+                )
+                break
+            except asyncio.TimeoutError:
+                # Only earlier attempts are bounded; a timeout on the last one
+                # surfaces as httpx.TimeoutException below
+                logger.warning(
+                    f"OpenRouter call timed out after {settings.OPENROUTER_TIMEOUT}s "
+                    f"(attempt {attempt}/{OPENROUTER_ATTEMPTS}), retrying"
+                )
+        response.raise_for_status()
+        
+        data = response.json()
+        
+        # Extract response
+        if "choices" in data and len(data["choices"]) > 0:
+            message_content = data["choices"][0]["message"]["content"]
             
-            # Extract response
-            if "choices" in data and len(data["choices"]) > 0:
-                message_content = data["choices"][0]["message"]["content"]
-                
-                return {
-                    "answer": message_content.strip(),
-                    "model": model,
-                    "usage": data.get("usage", {}),
-                    "timestamp": datetime.utcnow().isoformat()
-                }
-            else:
-                raise ValueError("No valid response from OpenRouter")
+            return {
+                "answer": message_content.strip(),
+                "model": model,
+                "usage": data.get("usage", {}),
+                "http_version": response.http_version,
+                "timestamp": datetime.utcnow().isoformat()
+            }
+        else:
+            raise ValueError("No valid response from OpenRouter")
                 
     except httpx.HTTPError as e:
         logger.error(f"HTTP error calling OpenRouter: {e}")
@@ -187,6 +307,60 @@ async def call_openrouter(messages: List[Dict[str, str]], model: Optional[str] =
         raise
 
 
+async def stream_openrouter(
+    messages: List[Dict[str, str]],
+    model: Optional[str] = None
+) -> AsyncIterator[str]:
+    """
+    Call OpenRouter with streaming enabled, yielding answer text as it arrives.
+    
+    Args:
+        messages: List of conversation messages
+        model: Optional model override
+    
+    Yields:
+        Pieces of the generated answer
+    """
+    if model is None:
+        model = settings.OPENROUTER_MODEL
+    
+    headers, payload = _openrouter_request(messages, model, stream=True)
+    
+    try:
+        async with get_http_client().stream(
+            "POST",
+            OPENROUTER_URL,
+            json=payload,
+            headers=headers
+        ) as response:
+            response.raise_for_status()
+            
+            async for line in response.aiter_lines():
+                # Only "data:" lines carry events; others are SSE comments/keep-alives
+                if not line.startswith("data:"):
+                    continue
+                data = line[5:].strip()
+                if data == "[DONE]":
+                    break
+                
+                event = json.loads(data)
+                if "error" in event:
+                    raise ValueError(f"OpenRouter stream error: {event['error']}")
+                
+                choices = event.get("choices") or []
+                if choices:
+                    content = choices[0].get("delta", {}).get("content")
+                    if content:
+                        yield content
+                        
+    except httpx.HTTPError as e:
+        logger.error(f"HTTP error streaming from OpenRouter: {e}")
+        raise
+    except Exception as e:
+        logger.error(f"Error streaming from OpenRouter: {e}")
+        raise
+
+
 async def generate_answer(
     query: str,
     chunks: List[Dict[str, Any]],
@@ -232,6 +406,37 @@ async def generate_answer(
     return result
 
 
+async def generate_answer_stream(
+    query: str,
+    chunks: List[Dict[str, Any]],
+    model: Optional[str] = None,
+    history: Optional[List[Dict[str, str]]] = None,
+) -> AsyncIterator[str]:
+    """
+    Generate an answer like generate_answer, yielding it piece by piece.
+    
+    Args:
+        query: User's question
+        chunks: Relevant document chunks from vector search
+        model: Optional LLM model override
+        history: Optional recent chat history
+    
+    Yields:
+        Pieces of the generated answer
+    """
+    if not chunks:
+        yield "I couldn't find any relevant information in the documents to answer your question."
+        return
+    
+    messages = build_context_prompt(query, chunks, history)
+    
+    logger.info(f"Streaming answer for query: {query[:100]}...")
+    logger.debug(f"Context chunks: {len(chunks)}")
+    
+    async for content in stream_openrouter(messages, model):
+        yield content
+
+
 async def test_llm_connection(model: Optional[str] = None) -> bool:
     """
     Test connection to OpenRouter API.
@@ -248,7 +453,7 @@ async def test_llm_connection(model: Optional[str] = None) -> bool:
     
     try:
         result = await call_openrouter(test_messages, model)
-        logger.info("LLM connection test successful")
+        logger.info(f"LLM connection test successful ({result.get('http_version')})")
         return True
     except Exception as e:
         logger.error(f"LLM connection test failed: {e}")
@@ -265,27 +470,18 @@ def extract_citations_from_answer(answer: str) -> List[str]:
     Returns:
         List of citation strings found in the answer
     """
-    import re
-    
-    # Look for patterns like [Document Title, Page 1] or [Document Title]
-    citation_patterns = [
-        r'\[([^\]]+)\]',  # Basic [citation] pattern
-        r'\(([^)]+, [Pp]age \d+)\)',  # (citation, page X) pattern
-        r'\(([^)]+)\)'  # Basic (citation) pattern
-    ]
-    
     citations = []
-    for pattern in citation_patterns:
-        matches = re.findall(pattern, answer)
-        citations.extend(matches)
+    for pattern in CITATION_PATTERNS:
+        citations.extend(pattern.findall(answer))
     
     # Remove duplicates while preserving order
-    unique_citations = []
-    for citation in citations:
-        if citation not in unique_citations:
-            unique_citations.append(citation)
-    
-    return unique_citations
+    return list(dict.fromkeys(citations))
+
+
+@lru_cache(maxsize=5000)
+def _chunk_words(text: str) -> frozenset:
+    """Lowercased word set of a chunk, cached since chunks recur across questions."""
+    return frozenset(text.lower().split())
 
 
 def validate_answer_quality(answer: str, query: str, chunks: List[Dict[str, Any]]) -> Dict[str, Any]:
@@ -300,21 +496,21 @@ def validate_answer_quality(answer: str, query: str, chunks: List[Dict[str, Any]
     Returns:
         Dictionary with quality metrics
     """
+    answer_lower = answer.lower()
     metrics = {
         "answer_length": len(answer),
         "has_citations": bool(extract_citations_from_answer(answer)),
-        "not_found_response": "couldn't find" in answer.lower() or "not in the" in answer.lower(),
+        "not_found_response": "couldn't find" in answer_lower or "not in the" in answer_lower,
         "chunk_coverage": 0
     }
     
     # Check how many chunks are referenced
-    answer_lower = answer.lower()
+    answer_words = set(answer_lower.split())
     referenced_chunks = 0
     
     for chunk in chunks:
         # Simple check for key terms from chunk in answer
-        chunk_words = set(chunk.get("text", "").lower().split())
-        answer_words = set(answer_lower.split())
+        chunk_words = _chunk_words(chunk.get("text", ""))
         
         # If there's significant overlap, consider chunk referenced
         overlap = len(chunk_words & answer_words)
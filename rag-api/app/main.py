@@ -1,14 +1,17 @@
 """FastAPI main application for Paperless RAG Q&A system."""
 
+import json
 import logging
 import sys
+import time
 from contextlib import asynccontextmanager
-from typing import List, Optional
+from typing import List, Optional, Tuple
 import asyncio
+import numpy as np
 
 from fastapi import FastAPI, HTTPException, Depends, BackgroundTasks
 from fastapi.middleware.cors import CORSMiddleware
-from fastapi.responses import JSONResponse
+from fastapi.responses import JSONResponse, ORJSONResponse, StreamingResponse
 from qdrant_client import QdrantClient
 from sentence_transformers import SentenceTransformer
 
@@ -18,11 +21,14 @@ from .models import (
     AskRequest, AskResponse, Citation, IngestRequest, IngestResponse,
     HealthResponse, DocumentInfo
 )
-from .paperless import test_connection as test_paperless_connection, list_documents, get_document
-from .retriever import search_similar_chunks, deduplicate_chunks
-from .llm import generate_answer, test_llm_connection
+from .paperless import test_connection as test_paperless_connection, list_documents, iter_documents, get_document
+from .retriever import search_similar_chunks, deduplicate_chunks, embed_query
+from .cache import AnswerCache, make_context_key
+from .llm import generate_answer, generate_answer_stream, test_llm_connection, close_http_client
 from .ingest import ensure_collection, ingest_document, get_collection_stats
-from .paperless import build_document_url
+# Aliased: the /ingest endpoint below is also named ingest_documents
+from .ingest import ingest_documents as ingest_document_batch
+from .paperless import build_document_url, close_http_client as close_paperless_client
 
 # Configure logging
 logging.basicConfig(
@@ -41,6 +47,20 @@ qdrant_client: Optional[QdrantClient] = None
 embedding_model: Optional[SentenceTransformer] = None
 settings = get_settings()
 
+# Title matches fetched from paperless before ranking in /documents/search
+SEARCH_CANDIDATES = 100
+
+# Last /health result and when it was taken, reused for HEALTH_CACHE_SECONDS
+HEALTH_CACHE_SECONDS = 10
+health_cache: Optional[Tuple[float, HealthResponse]] = None
+
+# Answers to recent questions, reused for near-identical repeat questions
+answer_cache = AnswerCache(
+    max_entries=settings.ANSWER_CACHE_SIZE,
+    ttl_seconds=settings.ANSWER_CACHE_TTL,
+    threshold=settings.ANSWER_CACHE_THRESHOLD
+)
+
 
 @asynccontextmanager
 async def lifespan(app: FastAPI):
@@ -49,23 +69,39 @@ async def lifespan(app: FastAPI):
     logger.info("Starting Paperless RAG API...")
     
     global qdrant_client, embedding_model
+    startup_checks = None
     
     try:
         # Initialize Qdrant client
         logger.info(f"Connecting to Qdrant at {settings.QDRANT_URL}")
-        qdrant_client = QdrantClient(url=settings.QDRANT_URL)
+        qdrant_client = QdrantClient(
+            url=settings.QDRANT_URL,
+            prefer_grpc=settings.QDRANT_PREFER_GRPC,
+            timeout=30
+        )
         
         # Initialize embedding model
-        logger.info(f"Loading embedding model: {settings.EMBEDDING_MODEL}")
-        embedding_model = SentenceTransformer(settings.EMBEDDING_MODEL)
+        logger.info(f"Loading embedding model: {settings.EMBEDDING_MODEL} ({settings.EMBEDDING_BACKEND} backend)")
+        # The onnx/openvino backends need optimum installed; EMBEDDING_MODEL_FILE
+        # selects a specific export, e.g. an int8-quantized ONNX model
+        model_kwargs = {"file_name": settings.EMBEDDING_MODEL_FILE} if settings.EMBEDDING_MODEL_FILE else None
+        embedding_model = SentenceTransformer(
+            settings.EMBEDDING_MODEL,
+            backend=settings.EMBEDDING_BACKEND,
+            model_kwargs=model_kwargs
+        )
         
         # Ensure collection exists
         embedding_dim = embedding_model.get_sentence_embedding_dimension()
         ensure_collection(qdrant_client, embedding_dim)
         
-        # Test connections
-        await test_paperless_connection()
-        await test_llm_connection()
+        # Check connections in the background so a slow paperless or LLM
+        # provider doesn't hold up startup; /health reports readiness
+        startup_checks = asyncio.gather(
+            test_paperless_connection(),
+            test_llm_connection(),
+            return_exceptions=True
+        )
         
         logger.info("Startup complete")
         
@@ -77,6 +113,10 @@ async def lifespan(app: FastAPI):
     
     # Shutdown
     logger.info("Shutting down...")
+    if startup_checks is not None:
+        startup_checks.cancel()
+    await close_http_client()
+    await close_paperless_client()
 
 
 # Create FastAPI app
@@ -84,7 +124,9 @@ app = FastAPI(
     title="Paperless RAG Q&A API",
     description="A RAG system for Q&A over documents stored in paperless-ngx",
     version=__version__,
-    lifespan=lifespan
+    lifespan=lifespan,
+    # orjson serializes the citation-heavy /ask responses several times faster
+    default_response_class=ORJSONResponse
 )
 
 # Configure CORS - MUST be added immediately after app creation
@@ -129,57 +171,58 @@ def get_embedding_model() -> SentenceTransformer:
     return embedding_model
 
 
+async def check_component(check) -> str:
+    """
+    Run one health check and describe its outcome.
+    
+    Args:
+        check: Awaitable that raises or returns False when the component is down
+    
+    Returns:
+        "healthy", "error" or "error: <reason>"
+    """
+    try:
+        result = await check
+        return "error" if result is False else "healthy"
+    except Exception as e:
+        return f"error: {str(e)[:100]}"
+
+
 @app.get("/health", response_model=HealthResponse)
 async def health_check(
     qdrant: QdrantClient = Depends(get_qdrant_client),
     embedder: SentenceTransformer = Depends(get_embedding_model)
 ):
     """Health check endpoint."""
-    components = {
-        "qdrant": "unknown",
-        "embedding_model": "unknown",
-        "paperless": "unknown",
-        "llm": "unknown"
-    }
-    
-    # Test Qdrant
-    try:
-        qdrant.get_collections()
-        components["qdrant"] = "healthy"
-    except Exception as e:
-        components["qdrant"] = f"error: {str(e)[:100]}"
-    
-    # Test embedding model
-    try:
-        embedder.encode(["test"])
-        components["embedding_model"] = "healthy"
-    except Exception as e:
-        components["embedding_model"] = f"error: {str(e)[:100]}"
+    global health_cache
     
-    # Test paperless connection
-    try:
-        paperless_healthy = await test_paperless_connection()
-        components["paperless"] = "healthy" if paperless_healthy else "error"
-    except Exception as e:
-        components["paperless"] = f"error: {str(e)[:100]}"
+    # Probes arrive every few seconds; reuse a recent result instead of
+    # re-encoding and spending an LLM round-trip on each one
+    now = time.monotonic()
+    if health_cache is not None and now - health_cache[0] < HEALTH_CACHE_SECONDS:
+        return health_cache[1]
     
-    # Test LLM connection
-    try:
-        llm_healthy = await test_llm_connection()
-        components["llm"] = "healthy" if llm_healthy else "error"
-    except Exception as e:
-        components["llm"] = f"error: {str(e)[:100]}"
+    # Run the checks concurrently, with the blocking ones off the event loop
+    statuses = await asyncio.gather(
+        check_component(asyncio.to_thread(qdrant.get_collections)),
+        check_component(asyncio.to_thread(embedder.encode, ["test"])),
+        check_component(test_paperless_connection()),
+        check_component(test_llm_connection())
+    )
+    components = dict(zip(["qdrant", "embedding_model", "paperless", "llm"], statuses))
     
     # Determine overall status
     overall_status = "healthy" if all(
         status == "healthy" for status in components.values()
     ) else "degraded"
     
-    return HealthResponse(
+    response = HealthResponse(
         status=overall_status,
         version=__version__,
         components=components
     )
+    health_cache = (now, response)
+    return response
 
 
 @app.post("/ask", response_model=AskResponse)
@@ -192,68 +235,165 @@ async def ask_question(
     logger.info(f"Received question: {request.query[:100]}...")
     
     try:
-        # Search for relevant chunks - increase top_k for better coverage
-        top_k = request.top_k or settings.RAG_TOP_K
-        # Double the search results to ensure we get comprehensive coverage
-        search_k = top_k * 2 if top_k < 20 else top_k
-        chunks = search_similar_chunks(
-            qdrant_client=qdrant,
-            embedding_model=embedder,
-            query=request.query,
-            top_k=search_k,
-            filter_tags=request.filter_tags
-        )
-        
-        # If no chunks found and general chat is allowed, fall back to non-RAG response
-        if not chunks and request.allow_general_chat:
-            logger.info("No RAG context found; falling back to general chat mode")
-            llm_result = await generate_answer(request.query, [], history=request.history)
-            return AskResponse(
-                answer=llm_result["answer"],
-                citations=[],
-                query=request.query,
-                model_used=llm_result["model"]
-            )
-        elif not chunks:
-            logger.warning("No relevant chunks found for query")
-            return AskResponse(
-                answer="I couldn't find any relevant information in the documents to answer your question.",
-                citations=[],
-                query=request.query,
-                model_used=settings.OPENROUTER_MODEL
-            )
-        
-        # Deduplicate similar chunks
-        chunks = deduplicate_chunks(chunks)
-        
-        # Generate answer using LLM
-        llm_result = await generate_answer(request.query, chunks, history=request.history)
+        # Embedding the query and searching Qdrant are blocking calls; run them
+        # in a worker thread so other requests keep being served meanwhile
+        query_vector = await asyncio.to_thread(embed_query, embedder, request.query)
         
-        # Build citations
-        citations = []
-        for chunk in chunks:
-            citation = Citation(
-                doc_id=chunk["doc_id"],
-                title=chunk["title"],
-                page=chunk.get("page"),
-                score=chunk["score"],
-                url=build_document_url(chunk["doc_id"]),
-                snippet=chunk["text"][:300] + "..." if len(chunk["text"]) > 300 else chunk["text"]
-            )
-            citations.append(citation)
+        # Near-identical questions in the same context get the stored answer,
+        # skipping both the vector search and the LLM call
+        context_key = make_context_key(
+            history=request.history,
+            filter_tags=sorted(request.filter_tags or []),
+            top_k=request.top_k,
+            allow_general_chat=request.allow_general_chat
+        )
+        cached = answer_cache.get(query_vector, context_key)
+        if cached is not None:
+            return cached.model_copy(update={"query": request.query})
         
-        logger.info(f"Generated answer with {len(citations)} citations")
+        # An ingest finishing while we answer clears the cache; don't then
+        # store an answer built from the old index
+        generation = answer_cache.generation
+        response = await answer_question(request, qdrant, embedder, query_vector)
+        answer_cache.put(query_vector, context_key, response, generation=generation)
+        return response
         
+    except Exception as e:
+        logger.error(f"Error processing question: {e}")
+        raise HTTPException(status_code=500, detail=f"Error processing question: {str(e)}")
+
+
+async def retrieve_chunks(
+    request: AskRequest,
+    qdrant: QdrantClient,
+    embedder: SentenceTransformer,
+    query_vector: np.ndarray
+) -> List[dict]:
+    """Search for and deduplicate the chunks relevant to a question."""
+    # Search for relevant chunks - increase top_k for better coverage
+    top_k = request.top_k or settings.RAG_TOP_K
+    # Double the search results to ensure we get comprehensive coverage
+    search_k = top_k * 2 if top_k < 20 else top_k
+    chunks = await asyncio.to_thread(
+        search_similar_chunks,
+        qdrant_client=qdrant,
+        embedding_model=embedder,
+        query=request.query,
+        top_k=search_k,
+        filter_tags=request.filter_tags,
+        query_vector=query_vector
+    )
+    
+    # Deduplicate similar chunks
+    return deduplicate_chunks(chunks)
+
+
+def make_snippet(text: str, length: int = 300) -> str:
+    """Shorten chunk text for display, marking truncation with an ellipsis."""
+    return text[:length] + "..." if len(text) > length else text
+
+
+def build_citations(chunks: List[dict]) -> List[Citation]:
+    """Build citations for the chunks an answer was generated from."""
+    return [
+        Citation(
+            doc_id=chunk["doc_id"],
+            title=chunk["title"],
+            page=chunk.get("page"),
+            score=chunk["score"],
+            url=build_document_url(chunk["doc_id"]),
+            snippet=make_snippet(chunk["text"])
+        )
+        for chunk in chunks
+    ]
+
+
+async def answer_question(
+    request: AskRequest,
+    qdrant: QdrantClient,
+    embedder: SentenceTransformer,
+    query_vector: np.ndarray
+) -> AskResponse:
+    """Retrieve context for a question and generate its answer."""
+    chunks = await retrieve_chunks(request, qdrant, embedder, query_vector)
+    
+    # If no chunks found and general chat is allowed, fall back to non-RAG response
+    if not chunks and request.allow_general_chat:
+        logger.info("No RAG context found; falling back to general chat mode")
+        llm_result = await generate_answer(request.query, [], history=request.history)
         return AskResponse(
             answer=llm_result["answer"],
-            citations=citations,
+            citations=[],
             query=request.query,
             model_used=llm_result["model"]
         )
-        
+    elif not chunks:
+        logger.warning("No relevant chunks found for query")
+        return AskResponse(
+            answer="I couldn't find any relevant information in the documents to answer your question.",
+            citations=[],
+            query=request.query,
+            model_used=settings.OPENROUTER_MODEL
+        )
+    
+    # Generate answer using LLM
+    llm_result = await generate_answer(request.query, chunks, history=request.history)
+    
+    citations = build_citations(chunks)
+    logger.info(f"Generated answer with {len(citations)} citations")
+    
+    return AskResponse(
+        answer=llm_result["answer"],
+        citations=citations,
+        query=request.query,
+        model_used=llm_result["model"]
+    )
+
+
+def sse_event(data: dict) -> str:
+    """Format a dictionary as one server-sent event."""
+    return f"data: {json.dumps(data)}\n\n"
+
+
+@app.post("/ask/stream")
+async def ask_question_stream(
+    request: AskRequest,
+    qdrant: QdrantClient = Depends(get_qdrant_client),
+    embedder: SentenceTransformer = Depends(get_embedding_model)
+):
+    """
+    Ask a question and stream the answer as server-sent events.
+    
+    Each event is a JSON object: {"token": ...} frames carry the answer as it is
+    generated, and a final {"done": true, ...} frame carries the citations and
+    model. Errors after the stream has started arrive as an {"error": ...} frame.
+    """
+    logger.info(f"Received streaming question: {request.query[:100]}...")
+    
+    try:
+        query_vector = await asyncio.to_thread(embed_query, embedder, request.query)
+        chunks = await retrieve_chunks(request, qdrant, embedder, query_vector)
     except Exception as e:
         logger.error(f"Error processing question: {e}")
         raise HTTPException(status_code=500, detail=f"Error processing question: {str(e)}")
+    
+    citations = build_citations(chunks)
+    
+    async def events():
+        try:
+            async for token in generate_answer_stream(request.query, chunks, history=request.history):
+                yield sse_event({"token": token})
+            yield sse_event({
+                "done": True,
+                "citations": [citation.model_dump() for citation in citations],
+                "query": request.query,
+                "model_used": settings.OPENROUTER_MODEL
+            })
+        except Exception as e:
+            logger.error(f"Error streaming answer: {e}")
+            yield sse_event({"error": str(e)})
+    
+    return StreamingResponse(events(), media_type="text/event-stream")
 
 
 @app.post("/ingest", response_model=IngestResponse)
@@ -277,6 +417,8 @@ async def ingest_documents(
             )
             
             if result["status"] == "success":
+                # Cached answers may not reflect the new content
+                answer_cache.clear()
                 return IngestResponse(
                     message=f"Successfully ingested document {request.doc_id}",
                     documents_processed=1,
@@ -318,35 +460,32 @@ async def ingest_all_documents_background(
     logger.info("Starting background ingestion of all documents")
     
     try:
-        # Get list of documents from paperless
-        docs_response = await list_documents(updated_after=updated_after)
-        documents = docs_response.get("results", [])
+        # Get list of documents from paperless, across all pages
+        documents = [doc async for doc in iter_documents(updated_after=updated_after)]
         
         total_docs = len(documents)
         processed = 0
         total_chunks = 0
         
-        for doc in documents:
-            doc_id = doc["id"]
-            try:
-                result = await ingest_document(
-                    doc_id=doc_id,
-                    qdrant_client=qdrant,
-                    embedding_model=embedder,
-                    force_reindex=force_reindex
-                )
-                
-                if result["status"] == "success":
-                    processed += 1
-                    total_chunks += result["chunks_created"]
-                    logger.info(f"Ingested document {doc_id} ({processed}/{total_docs})")
-                else:
-                    logger.warning(f"Skipped document {doc_id}: {result.get('reason', 'unknown')}")
-                
-            except Exception as e:
-                logger.error(f"Failed to ingest document {doc_id}: {e}")
-                continue
+        # Documents are embedded in shared batches rather than one at a time
+        results = await ingest_document_batch(
+            doc_ids=[doc["id"] for doc in documents],
+            qdrant_client=qdrant,
+            embedding_model=embedder,
+            force_reindex=force_reindex
+        )
         
+        for result in results:
+            doc_id = result["doc_id"]
+            if result["status"] == "success":
+                processed += 1
+                total_chunks += result["chunks_created"]
+                logger.info(f"Ingested document {doc_id} ({processed}/{total_docs})")
+            else:
+                logger.warning(f"Skipped document {doc_id}: {result.get('reason', result.get('error', 'unknown'))}")
+        
+        if processed:
+            answer_cache.clear()
         logger.info(f"Background ingestion complete: {processed}/{total_docs} documents, {total_chunks} chunks")
         
     except Exception as e:
@@ -360,19 +499,22 @@ async def search_documents(
 ):
     """Search for documents by title."""
     try:
-        docs_response = await list_documents()
+        # Paperless does the title match; fetch enough candidates to rank
+        docs_response = await list_documents(
+            title_contains=q,
+            page_size=max(limit, SEARCH_CANDIDATES)
+        )
         documents = docs_response.get("results", [])
         
-        # Simple title search
         query_lower = q.lower()
-        matching_docs = []
-        for doc in documents:
-            if query_lower in doc.get("title", "").lower():
-                matching_docs.append({
-                    "id": doc["id"],
-                    "title": doc["title"],
-                    "url": build_document_url(doc["id"])
-                })
+        matching_docs = [
+            {
+                "id": doc["id"],
+                "title": doc["title"],
+                "url": build_document_url(doc["id"])
+            }
+            for doc in documents
+        ]
         
         # Sort by relevance (exact match first)
         matching_docs.sort(key=lambda x: (
@@ -392,12 +534,22 @@ async def list_paperless_documents(
     offset: int = 0
 ):
     """List documents from paperless-ngx."""
+    if limit <= 0 or offset < 0:
+        return []
+    
     try:
-        docs_response = await list_documents()
-        documents = docs_response.get("results", [])
+        # Fetch only the paperless pages of size `limit` that overlap
+        # [offset, offset + limit): one page if offset is aligned, else two
+        first_page = offset // limit + 1
+        skip = offset % limit
+        pages = [first_page, first_page + 1] if skip else [first_page]
+        responses = await asyncio.gather(
+            *(list_documents(page=page, page_size=limit) for page in pages)
+        )
+        documents = [doc for response in responses for doc in response.get("results", [])]
         
         # Apply pagination
-        paginated_docs = documents[offset:offset + limit]
+        paginated_docs = documents[skip:skip + limit]
         
         # Convert to our model
         doc_infos = []
@@ -447,19 +599,25 @@ async def get_statistics(
 ):
     """Get system statistics."""
     try:
-        # Get collection stats
-        collection_stats = get_collection_stats(qdrant)
+        # Get collection stats off the event loop, alongside the paperless
+        # document count (only the total is needed, not the documents)
+        collection_stats, docs_response = await asyncio.gather(
+            asyncio.to_thread(get_collection_stats, qdrant),
+            list_documents(page_size=1),
+            return_exceptions=True
+        )
+        if isinstance(collection_stats, Exception):
+            raise collection_stats
         
-        # Get paperless document count
-        try:
-            docs_response = await list_documents()
-            paperless_doc_count = docs_response.get("count", 0)
-        except Exception:
+        if isinstance(docs_response, Exception):
             paperless_doc_count = "unknown"
+        else:
+            paperless_doc_count = docs_response.get("count", 0)
         
         return {
             "vector_database": collection_stats,
             "paperless_documents": paperless_doc_count,
+            "answer_cache": answer_cache.stats(),
             "embedding_model": settings.EMBEDDING_MODEL,
             "llm_model": settings.OPENROUTER_MODEL
         }
@@ -479,6 +637,7 @@ async def root():
         "endpoints": {
             "health": "/health",
             "ask": "/ask",
+            "ask_stream": "/ask/stream",
             "ingest": "/ingest",
             "documents": "/documents",
             "stats": "/stats"
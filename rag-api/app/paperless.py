@@ -1,7 +1,9 @@
 """Integration with paperless-ngx API."""
 
+import asyncio
 import logging
-from typing import Dict, List, Optional, Any
+import tempfile
+from typing import AsyncIterator, BinaryIO, Dict, List, Optional, Any, Union
 import httpx
 from .config import get_settings
 
@@ -11,11 +13,54 @@ settings = get_settings()
 # HTTP headers for paperless API authentication
 HEADERS = {"Authorization": f"Token {settings.PAPERLESS_API_TOKEN}"}
 
+# Downloads larger than this spill from memory to a temporary file
+DOWNLOAD_SPOOL_SIZE = 8 << 20
+
+# Size of the pieces downloads are streamed in
+DOWNLOAD_CHUNK_SIZE = 64 << 10
+
+# Timeout for file downloads; other requests use the client default of 60s
+DOWNLOAD_TIMEOUT = 120
+
+# Shared client so paperless calls reuse kept-alive connections instead of
+# connecting on every request; created on first use, closed on app shutdown
+_http_client: Optional[httpx.AsyncClient] = None
+
+
+def get_http_client() -> httpx.AsyncClient:
+    """
+    Get the shared HTTP client for paperless-ngx, creating it on first use.
+    
+    Returns:
+        Pooled httpx.AsyncClient with the base URL and auth headers set
+    """
+    global _http_client
+    if _http_client is None or _http_client.is_closed:
+        _http_client = httpx.AsyncClient(
+            base_url=settings.PAPERLESS_BASE_URL,
+            headers=HEADERS,
+            timeout=60,
+            limits=httpx.Limits(max_connections=64, max_keepalive_connections=32),
+            follow_redirects=True,
+            http2=True
+        )
+    return _http_client
+
+
+async def close_http_client():
+    """Close the shared HTTP client and its pooled connections."""
+    global _http_client
+    if _http_client is not None:
+        await _http_client.aclose()
+        _http_client = None
+
 
 async def list_documents(
     updated_after: Optional[str] = None,
     page_size: int = 100,
-    ordering: str = "-created"
+    ordering: str = "-created",
+    page: int = 1,
+    title_contains: Optional[str] = None
 ) -> Dict[str, Any]:
     """
     List documents from paperless-ngx.
@@ -24,30 +69,82 @@ async def list_documents(
         updated_after: ISO datetime string to filter documents modified after this time
         page_size: Number of documents per page
         ordering: Field to order by (e.g., "-created" for newest first)
+        page: 1-based page number
+        title_contains: Case-insensitive substring the title must contain
     
     Returns:
-        Dictionary containing documents list and pagination info
+        Dictionary containing documents list and pagination info. Pages past
+        the end come back with an empty results list.
     """
     params = {
         "ordering": ordering,
-        "page_size": page_size
+        "page_size": page_size,
+        "page": page
     }
     
     if updated_after:
         params["modified__gt"] = updated_after
+    if title_contains:
+        params["title__icontains"] = title_contains
     
-    async with httpx.AsyncClient(timeout=60) as client:
-        try:
-            response = await client.get(
-                f"{settings.PAPERLESS_BASE_URL}/api/documents/",
-                params=params,
-                headers=HEADERS
-            )
-            response.raise_for_status()
-            return response.json()
-        except httpx.HTTPError as e:
-            logger.error(f"Failed to list documents: {e}")
-            raise
+    client = get_http_client()
+    try:
+        response = await client.get(
+            "/api/documents/",
+            params=params
+        )
+        # paperless-ngx answers 404 for a page number past the last page
+        if response.status_code == 404 and page > 1:
+            return {"count": None, "next": None, "previous": None, "results": []}
+        response.raise_for_status()
+        return response.json()
+    except httpx.HTTPError as e:
+        logger.error(f"Failed to list documents: {e}")
+        raise
+
+
+async def iter_documents(
+    updated_after: Optional[str] = None,
+    page_size: int = 100,
+    ordering: str = "-created",
+    concurrency: int = 5
+) -> AsyncIterator[Dict[str, Any]]:
+    """
+    Iterate over every document in paperless-ngx, across all pages.
+    
+    The first page reveals the total count; the remaining pages are then
+    fetched concurrently and yielded in order as each one arrives.
+    
+    Args:
+        updated_after: ISO datetime string to filter documents modified after this time
+        page_size: Number of documents per page
+        ordering: Field to order by (e.g., "-created" for newest first)
+        concurrency: Maximum number of page requests in flight at once
+    
+    Yields:
+        Document dictionaries as returned by list_documents()
+    """
+    first_page = await list_documents(updated_after, page_size, ordering, page=1)
+    total_pages = -(-(first_page.get("count") or 0) // page_size)
+    
+    semaphore = asyncio.Semaphore(max(1, concurrency))
+    
+    async def fetch(page: int) -> Dict[str, Any]:
+        async with semaphore:
+            return await list_documents(updated_after, page_size, ordering, page=page)
+    
+    # Start on the remaining pages before handing out the first one
+    pending = [asyncio.ensure_future(fetch(page)) for page in range(2, total_pages + 1)]
+    try:
+        for doc in first_page.get("results", []):
+            yield doc
+        for task in pending:
+            for doc in (await task).get("results", []):
+                yield doc
+    finally:
+        # Don't leave requests running if the caller stopped early
+        for task in pending:
+            task.cancel()
 
 
 async def get_document(doc_id: int) -> Dict[str, Any]:
@@ -60,40 +157,120 @@ async def get_document(doc_id: int) -> Dict[str, Any]:
     Returns:
         Document metadata dictionary
     """
-    async with httpx.AsyncClient(timeout=60) as client:
-        try:
-            response = await client.get(
-                f"{settings.PAPERLESS_BASE_URL}/api/documents/{doc_id}/",
-                headers=HEADERS
-            )
-            response.raise_for_status()
-            return response.json()
-        except httpx.HTTPError as e:
-            logger.error(f"Failed to get document {doc_id}: {e}")
-            raise
+    client = get_http_client()
+    try:
+        response = await client.get(
+            f"/api/documents/{doc_id}/"
+        )
+        response.raise_for_status()
+        return response.json()
+    except httpx.HTTPError as e:
+        logger.error(f"Failed to get document {doc_id}: {e}")
+        raise
+
+
+async def fetch_documents_bulk(
+    doc_ids: List[int],
+    concurrency: int = 8
+) -> List[Union[Dict[str, Any], Exception]]:
+    """
+    Get metadata for several documents concurrently.
+    
+    Args:
+        doc_ids: Paperless document IDs
+        concurrency: Maximum number of requests in flight at once
+    
+    Returns:
+        Document metadata dictionaries in the order of doc_ids; a document
+        that could not be fetched has the raised exception in its place
+    """
+    semaphore = asyncio.Semaphore(max(1, concurrency))
+    
+    async def fetch(doc_id: int) -> Dict[str, Any]:
+        async with semaphore:
+            return await get_document(doc_id)
+    
+    return await asyncio.gather(*(fetch(doc_id) for doc_id in doc_ids), return_exceptions=True)
 
 
 async def download_document(doc_id: int) -> bytes:
     """
     Download the original document file.
     
+    Buffers the whole file in memory; prefer download_document_stream() or
+    download_document_file() for anything that may be large.
+    
     Args:
         doc_id: Paperless document ID
     
     Returns:
         Document file content as bytes
     """
-    async with httpx.AsyncClient(timeout=120) as client:
-        try:
-            response = await client.get(
-                f"{settings.PAPERLESS_BASE_URL}/api/documents/{doc_id}/download/",
-                headers=HEADERS
-            )
+    client = get_http_client()
+    try:
+        response = await client.get(
+            f"/api/documents/{doc_id}/download/",
+            timeout=DOWNLOAD_TIMEOUT
+        )
+        response.raise_for_status()
+        return response.content
+    except httpx.HTTPError as e:
+        logger.error(f"Failed to download document {doc_id}: {e}")
+        raise
+
+
+async def download_document_stream(
+    doc_id: int,
+    chunk_size: int = DOWNLOAD_CHUNK_SIZE
+) -> AsyncIterator[bytes]:
+    """
+    Stream the original document file in chunks as it is received.
+    
+    Args:
+        doc_id: Paperless document ID
+        chunk_size: Size of the yielded chunks in bytes
+    
+    Yields:
+        Successive pieces of the document file
+    """
+    client = get_http_client()
+    try:
+        async with client.stream(
+            "GET",
+            f"/api/documents/{doc_id}/download/",
+            timeout=DOWNLOAD_TIMEOUT
+        ) as response:
             response.raise_for_status()
-            return response.content
-        except httpx.HTTPError as e:
-            logger.error(f"Failed to download document {doc_id}: {e}")
-            raise
+            async for chunk in response.aiter_bytes(chunk_size):
+                yield chunk
+    except httpx.HTTPError as e:
+        logger.error(f"Failed to download document {doc_id}: {e}")
+        raise
+
+
+async def download_document_file(doc_id: int) -> BinaryIO:
+    """
+    Stream the original document file into a spooled temporary file.
+    
+    Small files stay in memory; anything over DOWNLOAD_SPOOL_SIZE is written to
+    disk as it arrives, so large PDFs are never held in memory as one bytes object.
+    
+    Args:
+        doc_id: Paperless document ID
+    
+    Returns:
+        Binary file object positioned at the start; the caller must close it
+    """
+    spool = tempfile.SpooledTemporaryFile(max_size=DOWNLOAD_SPOOL_SIZE)
+    try:
+        async for chunk in download_document_stream(doc_id):
+            spool.write(chunk)
+    except BaseException:
+        spool.close()
+        raise
+    
+    spool.seek(0)
+    return spool
 
 
 async def get_document_preview(doc_id: int) -> bytes:
@@ -106,17 +283,17 @@ async def get_document_preview(doc_id: int) -> bytes:
     Returns:
         Preview file content as bytes
     """
-    async with httpx.AsyncClient(timeout=120) as client:
-        try:
-            response = await client.get(
-                f"{settings.PAPERLESS_BASE_URL}/api/documents/{doc_id}/preview/",
-                headers=HEADERS
-            )
-            response.raise_for_status()
-            return response.content
-        except httpx.HTTPError as e:
-            logger.error(f"Failed to get preview for document {doc_id}: {e}")
-            raise
+    client = get_http_client()
+    try:
+        response = await client.get(
+            f"/api/documents/{doc_id}/preview/",
+            timeout=DOWNLOAD_TIMEOUT
+        )
+        response.raise_for_status()
+        return response.content
+    except httpx.HTTPError as e:
+        logger.error(f"Failed to get preview for document {doc_id}: {e}")
+        raise
 
 
 async def get_document_text(doc_id: int) -> str:
@@ -129,21 +306,21 @@ async def get_document_text(doc_id: int) -> str:
     Returns:
         Extracted text content
     """
-    async with httpx.AsyncClient(timeout=60) as client:
-        try:
-            response = await client.get(
-                f"{settings.PAPERLESS_BASE_URL}/api/documents/{doc_id}/download/",
-                headers={**HEADERS, "Accept": "text/plain"}
-            )
-            if response.status_code == 200:
-                return response.text
-            else:
-                # Fallback to downloading and extracting
-                logger.warning(f"Text endpoint not available for document {doc_id}, using file download")
-                return ""
-        except httpx.HTTPError as e:
-            logger.error(f"Failed to get text for document {doc_id}: {e}")
+    client = get_http_client()
+    try:
+        response = await client.get(
+            f"/api/documents/{doc_id}/download/",
+            headers={"Accept": "text/plain"}
+        )
+        if response.status_code == 200:
+            return response.text
+        else:
+            # Fallback to downloading and extracting
+            logger.warning(f"Text endpoint not available for document {doc_id}, using file download")
             return ""
+    except httpx.HTTPError as e:
+        logger.error(f"Failed to get text for document {doc_id}: {e}")
+        return ""
 
 
 def build_document_url(doc_id: int) -> str:
@@ -166,31 +343,31 @@ async def test_connection() -> bool:
     Returns:
         True if connection is successful, False otherwise
     """
-    async with httpx.AsyncClient(timeout=30, follow_redirects=True) as client:
+    client = get_http_client()
+    try:
+        # Try the documents endpoint instead of base API
+        response = await client.get(
+            "/api/documents/",
+            params={"page_size": 1},
+            timeout=30
+        )
+        response.raise_for_status()
+        logger.info("Successfully connected to paperless-ngx")
+        return True
+    except httpx.HTTPError as e:
+        logger.error(f"Failed to connect to paperless-ngx: {e}")
+        # Try alternative endpoint
         try:
-            # Try the documents endpoint instead of base API
             response = await client.get(
-                f"{settings.PAPERLESS_BASE_URL}/api/documents/",
-                headers=HEADERS,
-                params={"page_size": 1}
+                "/api/",
+                timeout=30
             )
-            response.raise_for_status()
-            logger.info("Successfully connected to paperless-ngx")
-            return True
-        except httpx.HTTPError as e:
-            logger.error(f"Failed to connect to paperless-ngx: {e}")
-            # Try alternative endpoint
-            try:
-                response = await client.get(
-                    f"{settings.PAPERLESS_BASE_URL}/api/",
-                    headers=HEADERS
-                )
-                if response.status_code == 200:
-                    logger.info("Connected to paperless-ngx (via base API)")
-                    return True
-            except:
-                pass
-            return False
+            if response.status_code == 200:
+                logger.info("Connected to paperless-ngx (via base API)")
+                return True
+        except:
+            pass
+        return False
 
 
 async def get_document_by_title(title: str) -> Optional[Dict[str, Any]]:
@@ -203,19 +380,18 @@ async def get_document_by_title(title: str) -> Optional[Dict[str, Any]]:
     Returns:
         Document metadata if found, None otherwise
     """
-    async with httpx.AsyncClient(timeout=60) as client:
-        try:
-            response = await client.get(
-                f"{settings.PAPERLESS_BASE_URL}/api/documents/",
-                params={"title__icontains": title},
-                headers=HEADERS
-            )
-            response.raise_for_status()
-            data = response.json()
-            
-            if data.get("results"):
-                return data["results"][0]
-            return None
-        except httpx.HTTPError as e:
-            logger.error(f"Failed to search for document with title '{title}': {e}")
-            return None
+    client = get_http_client()
+    try:
+        response = await client.get(
+            "/api/documents/",
+            params={"title__icontains": title}
+        )
+        response.raise_for_status()
+        data = response.json()
+        
+        if data.get("results"):
+            return data["results"][0]
+        return None
+    except httpx.HTTPError as e:
+        logger.error(f"Failed to search for document with title '{title}': {e}")
+        return None
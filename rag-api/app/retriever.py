@@ -1,9 +1,13 @@
 """Vector search and retrieval functionality."""
 
 import logging
+from functools import lru_cache
 from typing import List, Dict, Any, Optional, Tuple
 from qdrant_client import QdrantClient
-from qdrant_client.http.models import Filter, FieldCondition, MatchAny
+from qdrant_client.http.models import (
+    Filter, FieldCondition, MatchAny, MatchValue, SearchParams, QuantizationSearchParams
+)
+import numpy as np
 from sentence_transformers import SentenceTransformer
 
 from .config import get_settings
@@ -13,6 +17,98 @@ settings = get_settings()
 
 COLLECTION_NAME = "paperless_chunks"
 
+# Vectors are searched in their int8-quantized form; the top candidates (twice
+# as many as requested) are then rescored against the original vectors
+SEARCH_PARAMS = SearchParams(
+    hnsw_ef=128,
+    quantization=QuantizationSearchParams(rescore=True, oversampling=2.0)
+)
+
+# Recent query embeddings kept by embed_query(); repeated questions skip encoding
+QUERY_EMBEDDING_CACHE_SIZE = 1024
+
+
+@lru_cache(maxsize=QUERY_EMBEDDING_CACHE_SIZE)
+def _encode_query(embedding_model: SentenceTransformer, query: str) -> np.ndarray:
+    """Encode a query; cached, so the embedding is returned read-only."""
+    # Normalized to match the stored vectors, which the collection compares by dot product.
+    # A single string encodes straight to a 1-D float32 array, with no list round-trip.
+    query_vector = embedding_model.encode(query, normalize_embeddings=True, convert_to_numpy=True)
+    query_vector = np.asarray(query_vector, dtype=np.float32)
+    query_vector.flags.writeable = False
+    return query_vector
+
+
+def embed_query(embedding_model: SentenceTransformer, query: str) -> np.ndarray:
+    """
+    Embed a search query.
+    
+    Embeddings of recent queries are cached by text, so compute this once per
+    request and pass it to search_similar_chunks() and the answer cache.
+    
+    Args:
+        embedding_model: Sentence transformer model for embeddings
+        query: Search query text
+    
+    Returns:
+        L2-normalized query embedding as a read-only float32 array
+    """
+    return _encode_query(embedding_model, query)
+
+
+def _format_search_results(search_results: List[Any]) -> List[Dict[str, Any]]:
+    """
+    Turn Qdrant search hits into chunk dictionaries, boosted and sorted by score.
+    
+    Args:
+        search_results: Scored points from a Qdrant search
+    
+    Returns:
+        Chunks with metadata and scores, best first
+    """
+    # Format results
+    formatted_results = []
+    for result in search_results:
+        chunk_data = {
+            "text": result.payload.get("text", ""),
+            "doc_id": result.payload.get("doc_id"),
+            "title": result.payload.get("title", f"Document {result.payload.get('doc_id')}") ,
+            "page": result.payload.get("page"),
+            "file_type": result.payload.get("file_type", "unknown"),
+            "tags": result.payload.get("tags", []),
+            "score": float(result.score),
+            "token_count": result.payload.get("token_count", 0)
+        }
+        formatted_results.append(chunk_data)
+    
+    # Project-aware boost: group by inferred project-related tags and boost grouped items
+    def infer_project_tags(tags: List[str]) -> Tuple[str, ...]:
+        keywords = ("project", "job", "site", "neom", "port", "warehouse", "contract")
+        lowered = [t.lower() for t in tags]
+        return tuple(sorted({t for t in lowered if any(k in t for k in keywords)}))
+    
+    project_groups: Dict[Tuple[str, ...], List[Dict[str, Any]]] = {}
+    for item in formatted_results:
+        key = infer_project_tags(item.get("tags", []))
+        project_groups.setdefault(key, []).append(item)
+    
+    for key, items in project_groups.items():
+        if not key or len(items) < 2:
+            continue
+        boost = min(0.05 * (len(items) - 1), 0.2)  # cap boost
+        for it in items:
+            it["score"] += boost
+    
+    formatted_results.sort(key=lambda x: x["score"], reverse=True)
+    return formatted_results
+
+
+def _tags_filter(filter_tags: Optional[List[str]]) -> Optional[Filter]:
+    """Build a filter matching chunks with any of the given tags, or None."""
+    if not filter_tags:
+        return None
+    return Filter(must=[FieldCondition(key="tags", match=MatchAny(any=filter_tags))])
+
 
 def search_similar_chunks(
     qdrant_client: QdrantClient,
@@ -20,7 +116,8 @@ def search_similar_chunks(
     query: str,
     top_k: int = None,
     filter_tags: Optional[List[str]] = None,
-    score_threshold: float = 0.2  # Lower threshold for better coverage
+    score_threshold: float = 0.2,  # Lower threshold for better coverage
+    query_vector: Optional[np.ndarray] = None
 ) -> List[Dict[str, Any]]:
     """
     Search for similar document chunks using vector similarity.
@@ -32,6 +129,7 @@ def search_similar_chunks(
         top_k: Number of top results to return
         filter_tags: Optional list of tags to filter by
         score_threshold: Minimum similarity score threshold
+        query_vector: Precomputed embed_query() result, to avoid re-embedding
     
     Returns:
         List of similar chunks with metadata and scores
@@ -41,22 +139,11 @@ def search_similar_chunks(
     
     try:
         # Generate query embedding
-        query_vector = embedding_model.encode([query], convert_to_tensor=False)
-        if hasattr(query_vector, 'tolist'):
-            query_vector = query_vector.tolist()
-        query_vector = query_vector[0]  # Get the first (and only) embedding
+        if query_vector is None:
+            query_vector = embed_query(embedding_model, query)
         
         # Build search filter
-        search_filter = None
-        if filter_tags:
-            search_filter = Filter(
-                must=[
-                    FieldCondition(
-                        key="tags",
-                        match=MatchAny(any=filter_tags)
-                    )
-                ]
-            )
+        search_filter = _tags_filter(filter_tags)
         
         # Perform vector search
         search_results = qdrant_client.search(
@@ -64,43 +151,11 @@ def search_similar_chunks(
             query_vector=query_vector,
             query_filter=search_filter,
             limit=top_k,
-            score_threshold=score_threshold
+            score_threshold=score_threshold,
+            search_params=SEARCH_PARAMS
         )
         
-        # Format results
-        formatted_results = []
-        for result in search_results:
-            chunk_data = {
-                "text": result.payload.get("text", ""),
-                "doc_id": result.payload.get("doc_id"),
-                "title": result.payload.get("title", f"Document {result.payload.get('doc_id')}") ,
-                "page": result.payload.get("page"),
-                "file_type": result.payload.get("file_type", "unknown"),
-                "tags": result.payload.get("tags", []),
-                "score": float(result.score),
-                "token_count": result.payload.get("token_count", 0)
-            }
-            formatted_results.append(chunk_data)
-        
-        # Project-aware boost: group by inferred project-related tags and boost grouped items
-        def infer_project_tags(tags: List[str]) -> Tuple[str, ...]:
-            keywords = ("project", "job", "site", "neom", "port", "warehouse", "contract")
-            lowered = [t.lower() for t in tags]
-            return tuple(sorted({t for t in lowered if any(k in t for k in keywords)}))
-        
-        project_groups: Dict[Tuple[str, ...], List[Dict[str, Any]]] = {}
-        for item in formatted_results:
-            key = infer_project_tags(item.get("tags", []))
-            project_groups.setdefault(key, []).append(item)
-        
-        for key, items in project_groups.items():
-            if not key or len(items) < 2:
-                continue
-            boost = min(0.05 * (len(items) - 1), 0.2)  # cap boost
-            for it in items:
-                it["score"] += boost
-        
-        formatted_results.sort(key=lambda x: x["score"], reverse=True)
+        formatted_results = _format_search_results(search_results)
         logger.info(f"Found {len(formatted_results)} similar chunks for query (with project grouping boost)")
         return formatted_results
         
@@ -127,7 +182,7 @@ def search_by_document_id(
     """
     try:
         search_filter = Filter(
-            must=[FieldCondition(key="doc_id", match=doc_id)]
+            must=[FieldCondition(key="doc_id", match=MatchValue(value=doc_id))]
         )
         
         # Use scroll for better performance with large results
@@ -194,10 +249,13 @@ def hybrid_search(
     
     # Simple keyword matching boost
     query_keywords = set(query.lower().split())
+    if not query_keywords:
+        return vector_results[:top_k]
     
     for result in vector_results:
-        text_words = set(result["text"].lower().split())
-        keyword_overlap = len(query_keywords & text_words) / len(query_keywords)
+        # Only the few query words are hashed into a set; the chunk's words are
+        # streamed through intersection() without building a set of their own
+        keyword_overlap = len(query_keywords.intersection(result["text"].lower().split())) / len(query_keywords)
         
         # Combine vector score with keyword score
         vector_score = result["score"]
@@ -236,8 +294,37 @@ def get_chunks_summary(
                 must=[FieldCondition(key="doc_id", match=MatchAny(any=doc_ids))]
             )
         
-        # Get all chunks (using scroll for efficiency)
-        all_chunks = []
+        # Histograms are aggregated by Qdrant from the payload indexes
+        total_chunks = qdrant_client.count(
+            collection_name=COLLECTION_NAME,
+            count_filter=search_filter,
+            exact=True
+        ).count
+        file_types = {
+            hit.value: hit.count
+            for hit in qdrant_client.facet(
+                collection_name=COLLECTION_NAME,
+                key="file_type",
+                facet_filter=search_filter,
+                limit=100,
+                exact=True
+            ).hits
+        }
+        top_tags = {
+            hit.value: hit.count
+            for hit in qdrant_client.facet(
+                collection_name=COLLECTION_NAME,
+                key="tags",
+                facet_filter=search_filter,
+                limit=10,
+                exact=True
+            ).hits
+        }
+        
+        # Document and token totals still need a scroll, but only over two
+        # small payload fields, folded in page by page
+        unique_docs = set()
+        total_tokens = 0
         offset = None
         
         while True:
@@ -245,41 +332,25 @@ def get_chunks_summary(
                 collection_name=COLLECTION_NAME,
                 scroll_filter=search_filter,
                 limit=1000,
-                offset=offset
+                offset=offset,
+                with_payload=["doc_id", "token_count"]
             )
             
-            all_chunks.extend(chunks)
+            for chunk in chunks:
+                unique_docs.add(chunk.payload.get("doc_id"))
+                total_tokens += chunk.payload.get("token_count", 0)
             
             if next_offset is None:
                 break
             offset = next_offset
         
-        # Calculate statistics
-        total_chunks = len(all_chunks)
-        unique_docs = set()
-        total_tokens = 0
-        file_types = {}
-        tag_counts = {}
-        
-        for chunk in all_chunks:
-            payload = chunk.payload
-            
-            unique_docs.add(payload.get("doc_id"))
-            total_tokens += payload.get("token_count", 0)
-            
-            file_type = payload.get("file_type", "unknown")
-            file_types[file_type] = file_types.get(file_type, 0) + 1
-            
-            for tag in payload.get("tags", []):
-                tag_counts[tag] = tag_counts.get(tag, 0) + 1
-        
         return {
             "total_chunks": total_chunks,
             "unique_documents": len(unique_docs),
             "total_tokens": total_tokens,
             "average_tokens_per_chunk": total_tokens / total_chunks if total_chunks > 0 else 0,
             "file_type_distribution": file_types,
-            "top_tags": dict(sorted(tag_counts.items(), key=lambda x: x[1], reverse=True)[:10])
+            "top_tags": top_tags
         }
         
     except Exception as e:
@@ -318,25 +389,31 @@ def deduplicate_chunks(chunks: List[Dict[str, Any]], similarity_threshold: float
         best_chunk = max(doc_chunk_list, key=lambda x: x.get("score", 0))
         deduplicated.append(best_chunk)
     
-    # Second pass: Add additional high-scoring chunks if not too similar
-    remaining_chunks = []
-    for chunk in chunks:
-        if chunk not in deduplicated:
-            remaining_chunks.append(chunk)
+    # Second pass: Add additional high-scoring chunks if not too similar.
+    # Each chunk's word set is built once, not once per comparison.
+    words = {id(chunk): set(chunk["text"].lower().split()) for chunk in chunks}
+    kept_ids = {id(chunk) for chunk in deduplicated}
+    remaining_chunks = [chunk for chunk in chunks if id(chunk) not in kept_ids]
     
     # Sort remaining by score
     remaining_chunks.sort(key=lambda x: x.get("score", 0), reverse=True)
     
     for chunk in remaining_chunks:
         is_duplicate = False
-        chunk_text = chunk["text"].lower()
+        chunk_words = words[id(chunk)]
         
         for existing in deduplicated:
-            existing_text = existing["text"].lower()
+            existing_words = words[id(existing)]
+            
+            # Jaccard similarity is at most the ratio of the set sizes, so
+            # chunks of very different lengths can't be duplicates
+            smaller, larger = sorted((len(chunk_words), len(existing_words)))
+            if smaller <= similarity_threshold * larger:
+                continue
             
             # Simple similarity check based on text overlap
-            overlap = len(set(chunk_text.split()) & set(existing_text.split()))
-            total_words = len(set(chunk_text.split()) | set(existing_text.split()))
+            overlap = len(chunk_words & existing_words)
+            total_words = len(chunk_words) + len(existing_words) - overlap
             
             if total_words > 0 and overlap / total_words > similarity_threshold:
                 is_duplicate = True
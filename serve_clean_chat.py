@@ -4,16 +4,27 @@ Serve the clean chat UI with proper CORS headers.
 This server is designed to work seamlessly with the Paperless RAG API.
 """
 
+import gzip
+import hashlib
 import http.server
-import socketserver
+import io
+import mimetypes
 import os
 import sys
 import json
+import threading
 from urllib.parse import urlparse
 
+# Content types worth gzip-compressing
+COMPRESSIBLE_TYPES = ('text/', 'application/javascript', 'application/json')
+
 class CORSRequestHandler(http.server.SimpleHTTPRequestHandler):
     """HTTP request handler with CORS headers."""
     
+    # file path -> (mtime, etag, gzipped body), shared by all handler threads
+    gzip_cache = {}
+    gzip_cache_lock = threading.Lock()
+    
     def __init__(self, *args, **kwargs):
         # Set the directory to serve files from
         super().__init__(*args, directory="web-ui", **kwargs)
@@ -23,7 +34,9 @@ class CORSRequestHandler(http.server.SimpleHTTPRequestHandler):
         self.send_header('Access-Control-Allow-Origin', '*')
         self.send_header('Access-Control-Allow-Methods', 'GET, POST, OPTIONS')
         self.send_header('Access-Control-Allow-Headers', 'Content-Type, Authorization')
-        self.send_header('Cache-Control', 'no-store, no-cache, must-revalidate')
+        # Always revalidate, so UI changes show up at once; unchanged files
+        # then cost an empty 304 thanks to the ETag
+        self.send_header('Cache-Control', 'no-cache')
         super().end_headers()
     
     def do_OPTIONS(self):
@@ -35,7 +48,91 @@ class CORSRequestHandler(http.server.SimpleHTTPRequestHandler):
         """Serve the clean chat UI by default."""
         if self.path == '/':
             self.path = '/clean-chat.html'
-        return super().do_GET()
+        if not self.send_gzipped():
+            return super().do_GET()
+    
+    @classmethod
+    def load_gzipped(cls, path):
+        """Get (mtime, etag, gzipped body) for a file, compressing it only if new or changed."""
+        # Requests arrive as paths relative to web-ui; key everything absolutely
+        # so they hit the entries preload() made
+        path = os.path.abspath(path)
+        mtime = os.path.getmtime(path)
+        with cls.gzip_cache_lock:
+            cached = cls.gzip_cache.get(path)
+        if cached is None or cached[0] != mtime:
+            with open(path, 'rb') as f:
+                data = f.read()
+            cached = (mtime, f'"{hashlib.sha1(data).hexdigest()}"', gzip.compress(data, compresslevel=6))
+            with cls.gzip_cache_lock:
+                cls.gzip_cache[path] = cached
+        return cached
+    
+    @classmethod
+    def preload(cls, directory):
+        """Compress every text asset up front, so first requests don't pay for it."""
+        for root, _, files in os.walk(directory):
+            for name in files:
+                path = os.path.join(root, name)
+                ctype = mimetypes.guess_type(path)[0] or ''
+                if ctype.startswith(COMPRESSIBLE_TYPES):
+                    cls.load_gzipped(path)
+    
+    def send_gzipped(self):
+        """Send a text file gzip-compressed; returns False to fall back to plain serving."""
+        if 'gzip' not in self.headers.get('Accept-Encoding', ''):
+            return False
+        
+        path = self.translate_path(self.path)
+        ctype = self.guess_type(path)
+        if not os.path.isfile(path) or not ctype.startswith(COMPRESSIBLE_TYPES):
+            return False
+        
+        _, etag, body = self.load_gzipped(path)
+        
+        if self.headers.get('If-None-Match') == etag:
+            self.send_response(304)
+            self.send_header('ETag', etag)
+            self.end_headers()
+            return True
+        
+        self.send_response(200)
+        self.send_header('Content-Type', ctype)
+        self.send_header('Content-Encoding', 'gzip')
+        self.send_header('Content-Length', str(len(body)))
+        self.send_header('ETag', etag)
+        self.send_header('Vary', 'Accept-Encoding')
+        self.end_headers()
+        self.wfile.write(body)
+        return True
+    
+    def copyfile(self, source, outputfile):
+        """Copy a file to the socket with os.sendfile, skipping the user-space copy."""
+        if not hasattr(os, 'sendfile'):
+            # Windows has no sendfile
+            return super().copyfile(source, outputfile)
+        try:
+            in_fd = source.fileno()
+            out_fd = outputfile.fileno()
+        except (AttributeError, OSError, io.UnsupportedOperation):
+            # Not a real file (e.g. a directory listing); copy the usual way
+            return super().copyfile(source, outputfile)
+        
+        outputfile.flush()
+        offset = start = source.tell()
+        size = os.fstat(in_fd).st_size
+        while offset < size:
+            try:
+                sent = os.sendfile(out_fd, in_fd, offset, size - offset)
+            except OSError:
+                if offset != start:
+                    raise
+                # Nothing sent yet (sendfile unsupported for this pair of
+                # descriptors), so a buffered copy can still send the body
+                return super().copyfile(source, outputfile)
+            if sent == 0:
+                break
+            offset += sent
     
     def log_message(self, format, *args):
         """Custom log format."""
@@ -65,8 +162,12 @@ Starting server...
         print("❌ Error: clean-chat.html not found in web-ui directory!")
         sys.exit(1)
     
+    CORSRequestHandler.preload("web-ui")
+    
     try:
-        with socketserver.TCPServer(("", PORT), CORSRequestHandler) as httpd:
+        # One thread per connection so page assets load in parallel;
+        # HTTPServer also sets allow_reuse_address for quick restarts
+        with http.server.ThreadingHTTPServer(("", PORT), CORSRequestHandler) as httpd:
             print(f"✅ Server started successfully!")
             print(f"")
             print(f"📍 Access the chat UI at:")
@@ -3,6 +3,11 @@
 Start the web UI and ensure API has correct CORS settings.
 """
 
+import argparse
+import functools
+import os
+import shutil
+import signal
 import subprocess
 import sys
 import time
@@ -10,73 +15,241 @@ import webbrowser
 import threading
 from pathlib import Path
 
+# Upper bound for each docker CLI probe so a wedged daemon can't hang startup
+PROBE_TIMEOUT = 5
 
-def detect_docker_compose():
-    """Detect docker compose command."""
-    try:
-        result = subprocess.run(['docker', 'compose', '--version'], 
-                              capture_output=True, text=True)
-        if result.returncode == 0:
-            return 'docker compose'
-    except:
-        pass
+# Environment that makes both compose v2 and legacy docker-compose build with BuildKit
+BUILDKIT_ENV = ["DOCKER_BUILDKIT=1", "COMPOSE_DOCKER_CLI_BUILD=1"]
+
+# Docker detection results are remembered between runs for this long
+PROBE_CACHE_DIR = Path.home() / ".cache" / "paperless-rag"
+PROBE_CACHE_TTL = 24 * 60 * 60
+
+
+def cached_probe(name, fn, refresh=False):
+    """
+    Return fn()'s string result, reusing a copy saved by an earlier run.
     
+    Only non-empty results are saved, so a failed probe is retried next time.
+    """
+    path = PROBE_CACHE_DIR / name
+    if not refresh:
+        try:
+            if time.time() - path.stat().st_mtime < PROBE_CACHE_TTL:
+                return path.read_text().strip()
+        except OSError:
+            pass
+    
+    value = fn()
+    if value:
+        try:
+            PROBE_CACHE_DIR.mkdir(parents=True, exist_ok=True)
+            path.write_text(value)
+        except OSError:
+            pass
+    return value
+
+
+@functools.lru_cache(maxsize=1)
+def probe_docker():
+    """
+    Probe the docker CLI once with `docker info`.
+    
+    Returns (has_compose_plugin, daemon_ok). The client section, including
+    the plugin list, is printed even when the daemon refuses the connection,
+    so one exec answers both questions.
+    """
+    if not shutil.which('docker'):
+        return False, False
     try:
-        result = subprocess.run(['docker-compose', '--version'], 
-                              capture_output=True, text=True)
-        if result.returncode == 0:
-            return 'docker-compose'
-    except:
-        pass
+        result = subprocess.run(['docker', 'info'], capture_output=True, text=True,
+                                timeout=PROBE_TIMEOUT)
+    except (OSError, subprocess.TimeoutExpired):
+        return False, False
+    has_compose = any(line.strip().startswith('compose:') for line in result.stdout.splitlines())
+    return has_compose, result.returncode == 0
+
+
+@functools.lru_cache(maxsize=None)
+def detect_docker_compose(refresh=False):
+    """Detect docker compose command."""
+    return cached_probe('docker-compose-cmd', _detect_docker_compose, refresh) or None
+
+
+def _detect_docker_compose():
+    has_compose, _ = probe_docker()
+    if has_compose:
+        return 'docker compose'
+    
+    # Older CLIs don't list plugins in `docker info`; ask the plugin directly
+    if shutil.which('docker'):
+        try:
+            result = subprocess.run(['docker', 'compose', 'version'],
+                                    capture_output=True, text=True, timeout=PROBE_TIMEOUT)
+            if result.returncode == 0:
+                return 'docker compose'
+        except (OSError, subprocess.TimeoutExpired):
+            pass
+    
+    if shutil.which('docker-compose'):
+        return 'docker-compose'
     
     return None
 
 
-def check_docker_permissions():
+def check_docker_permissions(refresh=False):
     """Check if sudo is needed."""
+    # A "needs sudo" answer isn't cached: it may just mean the daemon is down
+    return cached_probe('docker-daemon-ok', lambda: '1' if probe_docker()[1] else '',
+                        refresh) == '1'
+
+
+# Time a timed-out command gets to exit after SIGTERM before it is killed
+KILL_GRACE = 5
+
+
+def _terminate(process, group):
+    """Stop a command started by run_command; group means it leads its own process group."""
+    if group and hasattr(os, 'killpg'):
+        def send(sig):
+            os.killpg(process.pid, sig)
+    else:
+        # Under sudo the real command is a root child we can't signal, but
+        # sudo relays the SIGTERM it receives to it
+        send = process.send_signal
     try:
-        result = subprocess.run(['docker', 'ps'], capture_output=True, text=True)
-        return result.returncode == 0
-    except:
-        return False
+        send(signal.SIGTERM)
+        process.wait(timeout=KILL_GRACE)
+    except subprocess.TimeoutExpired:
+        send(signal.SIGKILL)
+        process.wait()
+    except ProcessLookupError:
+        process.wait()
 
 
-def restart_api():
+def run_command(argv, need_sudo=False, timeout=None):
+    """
+    Run a command, streaming its combined output live; returns the exit code.
+    
+    No timeout by default, since a first image build (torch and friends) can
+    run for a long time; pass one for commands that should be quick.
+    """
+    if need_sudo:
+        argv = ['sudo', *argv]
+    cmd = ' '.join(argv)
+    
+    # A bounded command gets its own process group so a timeout can stop
+    # everything it spawned. Not under sudo, which needs the controlling
+    # terminal to prompt for a password and to find its cached credentials.
+    group = timeout is not None and not need_sudo
+    
+    # stderr is merged into stdout so a single reader preserves ordering
+    # and cannot deadlock on a full second pipe.
+    try:
+        process = subprocess.Popen(argv, stdout=subprocess.PIPE,
+                                   stderr=subprocess.STDOUT, text=True, bufsize=1,
+                                   start_new_session=group)
+    except OSError as e:
+        print(f"❌ Could not run {cmd}: {e}")
+        return -1
+    # The deadline is enforced from a timer so a command that goes quiet
+    # can't outlive it while we block reading its output
+    timed_out = threading.Event()
+    timer = None
+    if timeout is not None:
+        def expire():
+            timed_out.set()
+            _terminate(process, group)
+        timer = threading.Timer(timeout, expire)
+        timer.daemon = True
+        timer.start()
+    
+    try:
+        for line in process.stdout:
+            sys.stdout.write(f"   {line}")
+        returncode = process.wait()
+    finally:
+        if timer is not None:
+            timer.cancel()
+        process.stdout.close()
+    
+    if timed_out.is_set():
+        print(f"⚠️  Command timed out after {timeout}s: {cmd}")
+        return -1
+    return returncode
+
+
+def restart_api(refresh=False):
     """Restart the API with updated CORS settings."""
     print("🔄 Restarting API to apply configuration...")
     
-    compose_cmd = detect_docker_compose()
+    compose_cmd = detect_docker_compose(refresh)
     if not compose_cmd:
         print("❌ Docker Compose not found!")
         return False
     
-    need_sudo = not check_docker_permissions()
-    sudo_prefix = "sudo " if need_sudo else ""
+    need_sudo = not check_docker_permissions(refresh)
     
-    # Stop and start for a clean restart (more reliable than restart)
-    print("🛑 Stopping containers...")
-    stop_cmd = f"{sudo_prefix}{compose_cmd} down"
-    result = subprocess.run(stop_cmd, shell=True, capture_output=True, text=True)
+    # Rebuild and recreate in a single compose invocation; --force-recreate
+    # replaces the containers like a separate `down` would, without paying
+    # for a second compose run.
+    print("🚀 Rebuilding and recreating containers...")
+    # BuildKit builds independent stages concurrently. The variables go
+    # through `env` so they survive sudo's environment reset.
+    start_cmd = ['env', *BUILDKIT_ENV, *compose_cmd.split(),
+                 'up', '--build', '--force-recreate', '--remove-orphans', '-d']
+    returncode = run_command(start_cmd, need_sudo)
     
-    if result.returncode != 0:
-        print(f"⚠️  Stop command had issues: {result.stderr}")
-    
-    print("🚀 Starting containers...")
-    start_cmd = f"{sudo_prefix}{compose_cmd} up --build -d"
-    result = subprocess.run(start_cmd, shell=True, capture_output=True, text=True)
-    
-    if result.returncode == 0:
+    if returncode == 0:
         print("✅ API containers started successfully")
         return True
     else:
-        print(f"❌ Failed to start API: {result.stderr}")
+        print(f"❌ Failed to start API (exit code {returncode})")
         return False
 
 
+def show_api_logs(lines=10):
+    """Print the last lines of the API container's log."""
+    # docker-compose.yml pins container_name, so `docker logs` can address the
+    # container directly without a slower `compose logs` resolving the project.
+    run_command(['docker', 'logs', f'--tail={lines}', 'rag-api'],
+                need_sudo=not check_docker_permissions(), timeout=30)
+
+
+def wait_healthy(url, deadline=60.0, start=0.25):
+    """Poll a health endpoint with exponential backoff until it returns 200."""
+    import requests
+    
+    t0 = time.monotonic()
+    delay = start
+    attempt = 0
+    
+    with requests.Session() as session:
+        while True:
+            attempt += 1
+            remaining = deadline - (time.monotonic() - t0)
+            if remaining <= 0:
+                return False
+            
+            try:
+                # /health round-trips to the LLM, so allow it a few seconds
+                response = session.get(url, timeout=min(10, remaining))
+                if response.status_code == 200:
+                    return True
+                print(f"   Attempt {attempt}: API returned status {response.status_code}, retrying...")
+            except (requests.exceptions.ConnectionError, requests.exceptions.Timeout) as e:
+                print(f"   Attempt {attempt}: connection failed: {str(e)[:50]}..., retrying...")
+            
+            remaining = deadline - (time.monotonic() - t0)
+            if remaining <= 0:
+                return False
+            time.sleep(min(delay, remaining))
+            delay = min(delay * 2, 2.0)
+
+
 def start_ui_server():
     """Start the UI server in background."""
     import http.server
-    import socketserver
     import os
     
     # Change to web-ui directory
@@ -104,7 +277,8 @@ def start_ui_server():
             pass
     
     try:
-        with socketserver.TCPServer(("", PORT), CORSHTTPRequestHandler) as httpd:
+        # Threaded so page assets load in parallel; reuses the address on restart
+        with http.server.ThreadingHTTPServer(("", PORT), CORSHTTPRequestHandler) as httpd:
             print(f"🌐 UI Server started at: http://192.168.1.77:{PORT}")
             httpd.serve_forever()
     except Exception as e:
@@ -114,6 +288,11 @@ def start_ui_server():
 
 
 def main():
+    parser = argparse.ArgumentParser(description="Start the Paperless RAG web UI")
+    parser.add_argument("--refresh", action="store_true",
+                        help="re-detect docker compose instead of using the cached result")
+    args = parser.parse_args()
+    
     print("🚀 Starting Paperless RAG Web UI")
     print("=" * 40)
     
@@ -123,35 +302,19 @@ def main():
         sys.exit(1)
     
     # Restart API with updated CORS
-    if not restart_api():
+    if not restart_api(args.refresh):
         print("⚠️  API restart failed, continuing anyway...")
     
-    # Wait for API to start and test with retries
+    # Wait for API to start, returning as soon as /health answers
     print("⏳ Waiting for API to start...")
-    max_retries = 12  # 60 seconds total (5 seconds per retry)
-    retry_count = 0
-    api_ready = False
-    
-    import requests
+    api_ready = wait_healthy("http://192.168.1.77:8088/health")
     
-    while retry_count < max_retries and not api_ready:
-        try:
-            print(f"   Attempt {retry_count + 1}/{max_retries}...")
-            response = requests.get("http://192.168.1.77:8088/health", timeout=10)
-            if response.status_code == 200:
-                print("✅ API is running and healthy!")
-                api_ready = True
-            else:
-                print(f"   API returned status {response.status_code}, retrying...")
-        except Exception as e:
-            print(f"   Connection failed: {str(e)[:50]}..., retrying...")
-        
-        if not api_ready:
-            retry_count += 1
-            time.sleep(5)
-    
-    if not api_ready:
+    if api_ready:
+        print("✅ API is running and healthy!")
+    else:
         print("⚠️  API failed to start properly after 60 seconds")
+        print("   Last API log lines:")
+        show_api_logs()
         print("   You can still try the UI, or check: docker logs rag-api")
     
     # Start UI server in background thread